@@ -1,25 +1,85 @@
 import sys
+import json
+from datetime import date
+
+import boto3
 from awsglue.transforms import *
 from awsglue.utils import getResolvedOptions
 from pyspark.context import SparkContext
 from awsglue.context import GlueContext
 from awsglue.job import Job
 from awsglue.dynamicframe import DynamicFrame
-import re
 from pyspark.sql import functions as SqlFuncs
 
-args = getResolvedOptions(sys.argv, ["JOB_NAME"])
+#shipped with the job through --extra-py-files, with bgg_recommender.py
+from bgg_recommendations_spark import recommend_games
+
+#--snapshot_date YYYY-MM-DD limits the catalog reads to the partitions of a single snapshot
+#--marker_path s3://bucket/key.json enables the incremental mode: only the closed date partitions
+#newer than the last processed date stored in the marker are read, and the marker is moved afterwards.
+#A partition is closed once its date is before the run date, today's partition is still appended to
+#by the Lambda functions while the crawl runs, the same rule as bgg_compaction
+#--files_per_partition sets the number of files of each bgg_analytics_classification partition
+#Every date partition read is treated as a full snapshot: the top 5000 filter, the IDF of the
+#recommendations, and the latest snapshot all assume it. The delta runs of bgg_api only fetch the
+#new and changed games and are written to the <table>_delta type partitions, so they are skipped.
+optional_args = [arg for arg in ["snapshot_date", "marker_path", "files_per_partition"] if f"--{arg}" in sys.argv]
+args = getResolvedOptions(sys.argv, ["JOB_NAME"] + optional_args)
+files_per_partition = int(args.get("files_per_partition", "2"))
+full_snapshot_predicate = "type NOT LIKE '%_delta'"
+push_down_predicate = f"date = '{date.fromisoformat(args['snapshot_date'])}' AND {full_snapshot_predicate}" \
+    if "snapshot_date" in args else full_snapshot_predicate
+
+s3 = boto3.client("s3")
+glue = boto3.client("glue")
+incremental = "marker_path" in args
+new_dates = []
+
+#a single snapshot would move the marker past the earlier dates that were not processed yet
+if incremental and "snapshot_date" in args:
+    raise ValueError("--snapshot_date and --marker_path cannot be combined.")
+
+if incremental:
+    marker_bucket, marker_key = args["marker_path"][len("s3://"):].split("/", 1)
+    try:
+        marker = json.loads(s3.get_object(Bucket=marker_bucket, Key=marker_key)["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        marker = {"last_processed_date": None}
+
+    #the snapshot dates to process are taken from the catalog instead of scanning the table
+    expression = f"date < '{date.today()}' AND type = 'details'"
+    if marker["last_processed_date"]:
+        expression = f"date > '{marker['last_processed_date']}' AND {expression}"
+    paginator = glue.get_paginator("get_partitions")
+    new_dates = sorted({partition["Values"][0]
+                        for page in paginator.paginate(DatabaseName="bgg-database",
+                                                       TableName="bgg_transformed",
+                                                       Expression=expression)
+                        for partition in page["Partitions"]})
+
+    if new_dates:
+        push_down_predicate = "date in (" + ", ".join(f"'{snapshot}'" for snapshot in new_dates) + ")" \
+            + f" AND {full_snapshot_predicate}"
+
+    print(f"Last processed date: {marker['last_processed_date']}, new dates: {new_dates}")
+
 sc = SparkContext()
 glueContext = GlueContext(sc)
 spark = glueContext.spark_session
 job = Job(glueContext)
 job.init(args["JOB_NAME"], args)
 
+if incremental and not new_dates:
+    print("No new snapshot partitions to process.")
+    job.commit()
+    sys.exit(0)
+
 # Script generated for node AWS Glue Data Catalog
 AWSGlueDataCatalog_node1706204472650 = glueContext.create_dynamic_frame.from_catalog(
     database="bgg-database",
     table_name="bgg_transformed_classification",
     transformation_ctx="AWSGlueDataCatalog_node1706204472650",
+    push_down_predicate=push_down_predicate,
 )
 
 # Script generated for node AWS Glue Data Catalog
@@ -27,35 +87,34 @@ AWSGlueDataCatalog_node1706200220224 = glueContext.create_dynamic_frame.from_cat
     database="bgg-database",
     table_name="bgg_transformed",
     transformation_ctx="AWSGlueDataCatalog_node1706200220224",
+    push_down_predicate=push_down_predicate,
 )
 
 # Script generated for node Filter
-Filter_node1706206011410 = Filter.apply(
-    frame=AWSGlueDataCatalog_node1706204472650,
-    f=lambda row: (
-        bool(re.match("boardgamemechanic", row["classification"]))
-        or bool(re.match("boardgamecategory", row["classification"]))
+#startswith keeps the prefix match of re.match as a native Spark predicate
+Filter_node1706206011410 = DynamicFrame.fromDF(
+    AWSGlueDataCatalog_node1706204472650.toDF().filter(
+        SqlFuncs.col("classification").startswith("boardgamemechanic")
+        | SqlFuncs.col("classification").startswith("boardgamecategory")
     ),
-    transformation_ctx="Filter_node1706206011410",
+    glueContext,
+    "Filter_node1706206011410",
 )
 
 # Script generated for node Drop Duplicates
-DropDuplicates_node1706200291867 = DynamicFrame.fromDF(
-    AWSGlueDataCatalog_node1706200220224.toDF().dropDuplicates(),
-    glueContext,
-    "DropDuplicates_node1706200291867",
-)
+#a game is fetched once per snapshot, so (bgg_id, date) identifies a row without comparing every column
+DropDuplicates_node1706200291867 = AWSGlueDataCatalog_node1706200220224.toDF().dropDuplicates(["bgg_id", "date"])
 
 # Script generated for node Filter
-Filter_node1706200414982 = Filter.apply(
-    frame=DropDuplicates_node1706200291867,
-    f=lambda row: (
-        bool(re.match("boardgame", row["bgg_type"]))
-        and row["year_published"] < 2024
-        and row["bgg_rank"] > 0
-        and row["bgg_rank"] <= 5000
+Filter_node1706200414982 = DynamicFrame.fromDF(
+    DropDuplicates_node1706200291867.filter(
+        SqlFuncs.col("bgg_type").startswith("boardgame")
+        & (SqlFuncs.col("year_published") < 2024)
+        & (SqlFuncs.col("bgg_rank") > 0)
+        & (SqlFuncs.col("bgg_rank") <= 5000)
     ),
-    transformation_ctx="Filter_node1706200414982",
+    glueContext,
+    "Filter_node1706200414982",
 )
 
 # Script generated for node Drop Fields
@@ -91,26 +150,50 @@ RenamedkeysforJoin_node1706206276647 = ApplyMapping.apply(
 )
 
 # Script generated for node Join
-Join_node1706206084800 = Join.apply(
-    frame1=RenamedkeysforJoin_node1706206276647,
-    frame2=Filter_node1706206011410,
-    keys1=["bgg_id"],
-    keys2=["bgg_id"],
-    transformation_ctx="Join_node1706206084800",
+#the top 5000 games are broadcast, so the classification rows are joined without being shuffled
+Join_node1706206084800 = Filter_node1706206011410.toDF().join(
+    SqlFuncs.broadcast(RenamedkeysforJoin_node1706206276647.toDF()),
+    on="bgg_id",
+    how="inner",
 )
 
-# Script generated for node Drop Fields
-DropFields_node1706206238063 = DropFields.apply(
-    frame=Join_node1706206084800,
-    paths=["`.bgg_id`"],
-    transformation_ctx="DropFields_node1706206238063",
+# Script generated for node Repartition
+#mechanics and categories are two large partitions, so each is spread over files_per_partition
+#files by a salt of bgg_id, and the rows of each file are sorted by bgg_id
+Repartition_node1706206238063 = DynamicFrame.fromDF(
+    Join_node1706206084800.withColumn(
+        "salt", SqlFuncs.pmod(SqlFuncs.hash("bgg_id"), SqlFuncs.lit(files_per_partition))
+    )
+    .repartition("date", "type", "classification", "salt")
+    .sortWithinPartitions("date", "type", "classification", SqlFuncs.col("bgg_id").cast("int"))
+    .drop("salt"),
+    glueContext,
+    "Repartition_node1706206238063",
+)
+
+# Recommendations
+#every ranked game is recommended for, not only the top 5000 written to bgg_analytics, for the
+#new dates in the incremental mode and for the latest snapshot otherwise
+Recommendations_node = DynamicFrame.fromDF(
+    recommend_games(
+        spark,
+        DropDuplicates_node1706200291867.filter(
+            SqlFuncs.col("bgg_type").startswith("boardgame")
+            & (SqlFuncs.col("year_published") < 2024)
+            & (SqlFuncs.col("bgg_rank") > 0)
+        ),
+        Filter_node1706206011410.toDF(),
+        snapshots=new_dates if incremental else None,
+    ),
+    glueContext,
+    "Recommendations_node",
 )
 
 # Script generated for node Amazon S3
 AmazonS3_node1706200889119 = glueContext.getSink(
     path="s3://bgg-analytics-apsoutheast1-dev",
     connection_type="s3",
-    updateBehavior="UPDATE_IN_DATABASE",
+    updateBehavior="LOG" if incremental else "UPDATE_IN_DATABASE",
     partitionKeys=["date", "type"],
     enableUpdateCatalog=True,
     transformation_ctx="AmazonS3_node1706200889119",
@@ -124,7 +207,7 @@ AmazonS3_node1706200889119.writeFrame(DropFields_node1706200578067)
 AmazonS3_node1706206439647 = glueContext.getSink(
     path="s3://bgg-analytics-apsoutheast1-dev",
     connection_type="s3",
-    updateBehavior="UPDATE_IN_DATABASE",
+    updateBehavior="LOG" if incremental else "UPDATE_IN_DATABASE",
     partitionKeys=["date", "type", "classification"],
     enableUpdateCatalog=True,
     transformation_ctx="AmazonS3_node1706206439647",
@@ -133,5 +216,25 @@ AmazonS3_node1706206439647.setCatalogInfo(
     catalogDatabase="bgg-database", catalogTableName="bgg_analytics_classification"
 )
 AmazonS3_node1706206439647.setFormat("glueparquet", compression="snappy")
-AmazonS3_node1706206439647.writeFrame(DropFields_node1706206238063)
+AmazonS3_node1706206439647.writeFrame(Repartition_node1706206238063)
+# Amazon S3 - recommendations
+AmazonS3_Recommendations_node = glueContext.getSink(
+    path="s3://bgg-analytics-apsoutheast1-dev/bgg_recommendations/",
+    connection_type="s3",
+    updateBehavior="LOG" if incremental else "UPDATE_IN_DATABASE",
+    partitionKeys=["date"],
+    enableUpdateCatalog=True,
+    transformation_ctx="AmazonS3_Recommendations_node",
+)
+AmazonS3_Recommendations_node.setCatalogInfo(
+    catalogDatabase="bgg-database", catalogTableName="bgg_recommendations"
+)
+AmazonS3_Recommendations_node.setFormat("glueparquet", compression="snappy")
+AmazonS3_Recommendations_node.writeFrame(Recommendations_node)
+
+#the marker is moved only once all the outputs are written, so a failed run is processed again
+if incremental:
+    s3.put_object(Bucket=marker_bucket, Key=marker_key,
+                  Body=json.dumps({"last_processed_date": new_dates[-1]}).encode("utf-8"))
+
 job.commit()
@@ -1,13 +1,19 @@
 import os
-import io
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
 
 import requests
+import numpy as np
 import pandas as pd
 import boto3
+from boto3.s3.transfer import TransferConfig
 from dotenv import load_dotenv
 
-from bgg_webscrape import random_sleep
+from bgg_http import TokenBucket, ResponseCache, CachedSession, RetryPolicy, send_with_retries
+from bgg_storage import LocalS3Client, CompressingReader, compression_suffixes, delta_file_prefix
 
 #AWS parameters
 load_dotenv()
@@ -17,42 +23,82 @@ aws_region = os.getenv("AWS_REGION")
 role_arn = os.getenv("AWS_ROLE_ARN")
 bucket_name = os.getenv("S3_BUCKET_NAME")
 bucket_key = os.getenv("S3_BUCKET_KEY")
+s3_local_root = os.getenv("S3_LOCAL_ROOT") #stores the raw files locally instead of S3
+
+#Fetch engine parameters
+max_workers = int(os.getenv("BGG_MAX_WORKERS", "4"))
+requests_per_sec = float(os.getenv("BGG_REQUESTS_PER_SEC", "0.5"))
+api_state_path = os.getenv("BGG_API_STATE_PATH", "data/bgg_api_state.json")
+manifest_dir = os.getenv("BGG_MANIFEST_DIR", "data/manifests")
+resume_run = os.getenv("BGG_RESUME", "false").lower() == "true"
+
+#Retry parameters
+max_attempts = int(os.getenv("BGG_MAX_ATTEMPTS", "8"))
+backoff_base = float(os.getenv("BGG_BACKOFF_BASE", "1"))
+backoff_max = float(os.getenv("BGG_BACKOFF_MAX", "60"))
+
+#Response cache parameters
+cache_dir = os.getenv("BGG_CACHE_DIR") #responses are not cached if not set
+cache_ttl = int(os.getenv("BGG_CACHE_TTL_HOURS", "24")) * 3600
+cache_max_bytes = int(os.getenv("BGG_CACHE_MAX_MB", "2048")) * 1024 ** 2
+
+#Raw upload parameters
+raw_compression = os.getenv("BGG_RAW_COMPRESSION") or None #gzip, zstd, or uncompressed
+upload_config = TransferConfig(
+    multipart_threshold=int(os.getenv("BGG_UPLOAD_PART_SIZE_MB", "8")) * 1024 ** 2,
+    multipart_chunksize=int(os.getenv("BGG_UPLOAD_PART_SIZE_MB", "8")) * 1024 ** 2,
+    max_concurrency=int(os.getenv("BGG_UPLOAD_CONCURRENCY", "4")),
+)
+
+#Delta ingestion parameters
+#a delta run uploads only the new, changed, and stale games, its raw files are prefixed with
+#delta_file_prefix and the Lambda functions write them to the <table>_delta type partitions,
+#which bgg_analytics skips, so the analytics snapshots come from the full runs only
+delta_mode = os.getenv("BGG_DELTA", "false").lower() == "true"
+snapshot_path = os.getenv("BGG_SNAPSHOT_PATH", "data/boardgamegeek_fetched.csv")
+full_refresh_days = int(os.getenv("BGG_FULL_REFRESH_DAYS", "7"))
+delta_thresholds = {
+    "geek_rating": float(os.getenv("BGG_DELTA_RATING_THRESHOLD", "0.01")),
+    "avg_rating": float(os.getenv("BGG_DELTA_RATING_THRESHOLD", "0.01")),
+    "num_voters": float(os.getenv("BGG_DELTA_VOTERS_THRESHOLD", "0.01")), #relative change
+}
+listing_fields = list(delta_thresholds)
 
 #BGG dataframe
 df_bgg = pd.read_csv('data/boardgamegeek.csv')
 df_bgg['bgg_id'] = df_bgg['bgg_id'].astype(str)
 
 
-def request_connection(url, status_code=500):
-    """Sends a request to the target url until a response code of 200 is returned.
+def request_connection(url, retry_policy, rate_limiter=None, session=None):
+    """Sends a request to the target url, retrying failed attempts according to the retry policy.
 
     Parameters:
         url {string} -- the endpoint and query parameters of the target API.
-        status_code {int} -- HTTP response status codes that is initialized with a server error.
+        retry_policy {RetryPolicy} -- backoff, polling, and attempt budget shared by all workers.
+        rate_limiter {TokenBucket} -- optional token bucket shared by all workers that paces \
+            every request sent to the API.
+        session {CachedSession} -- optional pooled session with a response cache, requests \
+            are sent without keep-alive if not given.
 
     Returns:
-        {Response} -- contains the API response including the status code, headers, and content.
+        {Response} -- contains the API response with status code 200 or 414 including the \
+            headers, the content is streamed and has not been read yet.
     """
 
-    while status_code != 200:
-
-        random_sleep(min_sec=3, max_sec=5)
-
-        try:
-            response = requests.get(url)
-            status_code = response.status_code
+    try:
+        response = send_with_retries(url, retry_policy, rate_limiter, session)
 
-            if status_code != 200:
-                print(f"Status code: {status_code}.")
-                print("Error establishing connection. Retrying to connect.")
+    except Exception as e:
+        print(f"Exception occured: {e}")
+        raise
 
-            if status_code == 414:
-                print("URI too long.")
-                return response
+    if response.status_code == 414:
+        print("URI too long.")
 
-        except Exception as e:
-            print(f"Exception occured: {e}")
-            raise
+    elif response.status_code != 200:
+        response.close()
+        raise requests.HTTPError(f"Status code {response.status_code} cannot be retried: {url}",
+                                 response=response)
 
     return response
 
@@ -113,8 +159,10 @@ def initialize_aws_role_and_s3(access_key, secret_key, aws_region, role_arn):
         raise
 
 
-def upload_xml_to_s3(response, s3, bucket_name, bucket_key, file_name):
-    """Uploads binary data to AWS S3.
+def upload_xml_to_s3(response, s3, bucket_name, bucket_key, file_name, compression=None, \
+    config=None, run_date=None):
+    """Streams the API response body to AWS S3 through an optional compressor using a \
+        multipart upload.
 
     Parameters:
         response {Response class} -- contains the API response including the status code, \
@@ -125,51 +173,494 @@ def upload_xml_to_s3(response, s3, bucket_name, bucket_key, file_name):
         bucket_key {string} -- name of s3 bucket key where the files will be stored.
         file_name {string} -- desired name of the file that will be stored in the given \
             s3 bucket and key.
+        compression {string} -- 'gzip', 'zstd', or None to store the XML uncompressed.
+        config {TransferConfig} -- part size and concurrency of the multipart upload.
+        run_date {datetime} -- date partition of the file, the date of the run so a resumed \
+            run keeps all its files in one partition, today if not given.
 
     Returns:
-        {None} -- function returns no value but prints an update for files that were successfully \
-            uploaded to sS3 bucket.
+        {dict} -- S3 key, stored and uncompressed size in bytes, and SHA-256 checksum \
+            of the uploaded file.
     """
 
-    today = datetime.today().strftime("%Y-%d-%m")
+    today = (run_date or datetime.today()).strftime("%Y-%d-%m")
+    key = f"{bucket_key}date={today}/{file_name}.xml{compression_suffixes[compression]}"
 
     try:
+        body = CompressingReader(response.iter_content(chunk_size=64 * 1024), compression)
+
         s3.upload_fileobj(
-            Fileobj = io.BytesIO(response.content),
+            Fileobj = body,
             Bucket = bucket_name,
-            Key = f"{bucket_key}date={today}/{file_name}.xml"
+            Key = key,
+            Config = config,
         )
 
         print(f"Index {file_name} of BGG dataframe uploaded successfully to S3.")
 
+        return {
+            'key':key,
+            'bytes':body.stored_bytes,
+            'raw_bytes':body.raw_bytes,
+            'sha256':body.sha256.hexdigest(),
+        }
+
     except Exception as e:
         print(f"Error: {e}")
         raise
 
 
-def main():
-    "Main driver function."
+def load_api_state(state_path):
+    "Returns the state kept across runs in a JSON file, empty if there were no previous runs."
+
+    if not os.path.exists(state_path):
+        return {}
+
+    with open(state_path) as f:
+        return json.load(f)
+
+def save_api_state(state_path, **fields):
+    "Updates fields of the state kept across runs, the other fields are left as they are."
+
+    state = load_api_state(state_path)
+    state.update(fields)
+
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    with open(state_path, 'w') as f:
+        json.dump(state, f)
+
+def start_run(state_path, now, resume, delta):
+    """Determines the ID and date of the run. The last run is resumed with its own ID and date \
+        if it did not finish, so a run continued after midnight finds its manifest and keeps \
+        its raw files in the same date partition.
+
+    Parameters:
+        state_path {string} -- JSON file of the state kept across runs.
+        now {datetime} -- start time of the current run.
+        resume {bool} -- whether an unfinished run should be resumed.
+        delta {bool} -- whether the run only fetches the delta of the listing, a run of the \
+            other mode is not resumed.
+
+    Returns:
+        {dict} -- run_id, run_date, and delta of the run.
+    """
+
+    run = load_api_state(state_path).get('run')
+
+    if resume and run is not None and run['delta'] == delta:
+        print(f"Resuming run {run['run_id']} of {run['run_date']}.")
+        return run
+
+    run = {
+        'run_id':f"bgg_api_{now.strftime('%Y-%m-%d_%H%M%S')}" + ("_delta" if delta else ""),
+        'run_date':now.strftime('%Y-%m-%d'),
+        'delta':delta,
+    }
+    save_api_state(state_path, run=run)
+
+    return run
+
+
+def build_url(bgg_ids):
+    "Creates the BGG XML API thing endpoint for a list of board game IDs."
+
+    return 'https://boardgamegeek.com/xmlapi2/thing?id=' + ','.join(bgg_ids) + '&stats=1'
+
+
+class BatchPlanner:
+    """Packs board game IDs into API calls by the length of the encoded URL and learns the \
+        longest URL accepted by the API through binary search on 414 responses.
+
+    Parameters:
+        bgg_ids {series} -- board game IDs of the BGG dataframe.
+        state_path {string} -- JSON file where the learned URL lengths are kept across runs.
+        initial_length {int} -- URL length of the first call when there are no previous runs, \
+            roughly 1200 board games.
+        growth {float} -- factor used to probe longer URLs while no 414 has been observed.
+        tolerance {int} -- gap in characters between the accepted and rejected URL lengths \
+            where the binary search stops.
+    """
+
+    def __init__(self, bgg_ids, state_path, initial_length=8500, growth=1.25, tolerance=64):
+        self.bgg_ids = list(bgg_ids)
+        self.state_path = state_path
+        self.initial_length = initial_length
+        self.growth = growth
+        self.tolerance = tolerance
+
+        #url length of ids[:i] is base_length + offsets[i] - 1 (no trailing comma)
+        self.base_length = len(build_url([]))
+        self.offsets = np.concatenate(([0], np.cumsum([len(bgg_id) + 1 for bgg_id in self.bgg_ids])))
+
+        self.max_accepted, self.min_rejected = 0, None
+
+        state = load_api_state(state_path)
+        self.max_accepted = state.get('max_accepted', 0)
+        self.min_rejected = state.get('min_rejected')
+
+    def url_length(self, start, stop):
+        "Returns the length of the encoded URL for the board games between two indexes."
+
+        return self.base_length + int(self.offsets[stop] - self.offsets[start]) - 1
+
+    def target_length(self):
+        "Returns the URL length of the next API call based on the accepted and rejected lengths."
+
+        if self.min_rejected is None:
+            if self.max_accepted < self.initial_length:
+                return self.initial_length
+            return int(self.max_accepted * self.growth)
+
+        if self.min_rejected - self.max_accepted <= self.tolerance:
+            return self.max_accepted
+
+        return (self.max_accepted + self.min_rejected) // 2
+
+    def plan(self, start, end):
+        """Determines the end index of the next batch so its URL fits the target length.
+
+        Parameters:
+            start {int} -- index of the first board game of the batch.
+            end {int} -- index after the last board game that can be included in the batch.
+
+        Returns:
+            {int} -- index after the last board game of the batch, at least one board game \
+                is always included.
+        """
+
+        limit = self.offsets[start] + self.target_length() - self.base_length + 1
+        stop = int(np.searchsorted(self.offsets, limit, side='right')) - 1
+
+        return min(max(stop, start + 1), end)
+
+    def accept(self, length):
+        "Records a URL length that was accepted by the API."
+
+        self.max_accepted = max(self.max_accepted, length)
+
+        if self.min_rejected is not None and length >= self.min_rejected:
+            self.min_rejected = None #the limit was raised by the server
+
+    def reject(self, length):
+        "Records a URL length that was rejected by the API with a 414 status code."
+
+        self.min_rejected = length if self.min_rejected is None else min(self.min_rejected, length)
+
+        if self.max_accepted >= length:
+            self.max_accepted = 0 #the limit was lowered by the server
+
+    def save(self):
+        "Stores the learned URL lengths for the next runs."
+
+        save_api_state(self.state_path, max_accepted=self.max_accepted, min_rejected=self.min_rejected)
+
+
+class RunManifest:
+    """Append-only record of the index ranges uploaded during a run, used to resume a run \
+        that stopped part-way without downloading the completed ranges again.
+
+    Parameters:
+        path {string} -- JSON lines file of the run manifest.
+        bgg_ids {series} -- board game IDs of the BGG dataframe.
+    """
+
+    def __init__(self, path, bgg_ids):
+        self.path = path
+        self.bgg_ids = list(bgg_ids)
+        self.ranges = []
+
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    record = json.loads(line)
+
+                    #skip ranges that no longer refer to the same board games
+                    if record['stop'] <= len(self.bgg_ids) \
+                        and self.bgg_ids[record['start']] == record['first_id'] \
+                        and self.bgg_ids[record['stop'] - 1] == record['last_id']:
+                        self.ranges.append((record['start'], record['stop']))
+
+    def record(self, start, stop, upload):
+        """Appends an uploaded range to the manifest.
+
+        Parameters:
+            start {int} -- index of the first board game of the batch.
+            stop {int} -- index after the last board game of the batch.
+            upload {dict} -- S3 key, size in bytes, and checksum of the uploaded file.
+
+        Returns:
+            {None} -- function returns no value.
+        """
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({
+                'range':f"{start}-{stop}",
+                'start':start,
+                'stop':stop,
+                'first_id':self.bgg_ids[start],
+                'last_id':self.bgg_ids[stop - 1],
+                **upload,
+            }) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.ranges.append((start, stop))
+
+    def pending_ranges(self):
+        "Returns the index ranges of the BGG dataframe that are not yet in the manifest."
+
+        pending, n = [], 0
+
+        for start, stop in sorted(self.ranges):
+            if start > n:
+                pending.append((n, start))
+            n = max(n, stop)
+
+        if n < len(self.bgg_ids):
+            pending.append((n, len(self.bgg_ids)))
+
+        return pending
+
+
+def fetch_and_upload(url, file_name, s3, rate_limiter, session, retry_policy, run_date=None):
+    """Requests a single batch of board games from the BGG API and uploads the response to S3.
+
+    Parameters:
+        url {string} -- the endpoint and query parameters of the batch.
+        file_name {string} -- desired name of the file that will be stored in S3.
+        s3 {s3 client} -- an instance of the boto3 S3 client intialized with the \
+            credentials provided.
+        rate_limiter {TokenBucket} -- token bucket shared by all workers.
+        session {CachedSession} -- pooled session shared by all workers.
+        retry_policy {RetryPolicy} -- retry policy shared by all workers.
+        run_date {datetime} -- date partition of the uploaded file.
+
+    Returns:
+        {tuple} -- status code of the API response of the batch and the details of the \
+            uploaded file, if any.
+    """
+
+    response = request_connection(url, retry_policy, rate_limiter=rate_limiter, session=session)
+
+    #the streamed body of a 414 is closed too, so its connection goes back to the pool
+    with response:
+        if response.status_code != 200:
+            return response.status_code, None
+
+        upload = upload_xml_to_s3(response, s3, bucket_name, bucket_key, file_name,
+                                  raw_compression, upload_config, run_date)
+
+    return response.status_code, upload
+
+def requeue_range(pending, start, stop):
+    """Puts a rejected range back at the front of the pending ranges, merged with the pending \
+        ranges next to it so the remainder of the rejected batch is not sent as a small batch \
+        of its own.
+
+    Parameters:
+        pending {deque} -- index ranges that are not yet requested.
+        start {int} -- index of the first board game of the rejected batch.
+        stop {int} -- index after the last board game of the rejected batch.
+
+    Returns:
+        {None} -- function returns no value.
+    """
+
+    for pending_range in list(pending):
+        if pending_range[0] == stop:
+            pending.remove(pending_range)
+            stop = pending_range[1]
+        elif pending_range[1] == start:
+            pending.remove(pending_range)
+            start = pending_range[0]
+
+    pending.appendleft((start, stop))
+
+def fetch_batches(s3, max_workers, rate_limiter, planner, manifest, session, retry_policy,
+                  file_prefix="", run_date=None):
+    """Keeps a number of batch requests in flight until all board games of the planner \
+        are uploaded to S3.
+
+    Parameters:
+        s3 {s3 client} -- an instance of the boto3 S3 client intialized with the \
+            credentials provided.
+        max_workers {int} -- maximum number of batch requests in flight at the same time.
+        rate_limiter {TokenBucket} -- token bucket shared by all workers that limits the \
+            request rate to the API.
+        planner {BatchPlanner} -- determines the board games included in each API call.
+        manifest {RunManifest} -- records the uploaded ranges and provides the ranges that \
+            are still pending.
+        session {CachedSession} -- pooled session with an optional response cache.
+        retry_policy {RetryPolicy} -- backoff, polling, and attempt budget of each batch.
+        file_prefix {string} -- prefix of the uploaded file names.
+        run_date {datetime} -- date partition of the uploaded files.
+
+    Returns:
+        {int} -- number of batches uploaded to S3.
+    """
+
+    pending = deque(manifest.pending_ranges())
+    in_flight = {}
+    uploaded, rejected = 0, 0
+    total = len(planner.bgg_ids)
+    fetched = total - sum(end - start for start, end in pending)
+
+    if fetched > 0:
+        print(f"Resuming run. {fetched}/{total} board games found in the manifest.")
 
     try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+            while pending or in_flight:
+
+                while pending and len(in_flight) < max_workers:
+                    start, end = pending.popleft()
+                    stop = planner.plan(start, end)
+
+                    if stop < end:
+                        pending.appendleft((stop, end))
+
+                    url = build_url(planner.bgg_ids[start:stop])
+                    future = executor.submit(fetch_and_upload, url, f"{file_prefix}{start}-{stop}",
+                                             s3, rate_limiter, session, retry_policy, run_date)
+                    in_flight[future] = (start, stop, len(url))
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    start, stop, length = in_flight.pop(future)
+
+                    status_code, upload = future.result()
+
+                    if status_code == 414:
+                        planner.reject(length)
+                        rejected += 1
+                        requeue_range(pending, start, stop) #re-plan with a shorter URL
+                        continue
+
+                    planner.accept(length)
+                    manifest.record(start, stop, upload)
+                    uploaded += 1
+                    fetched += stop - start
+                    print(f"{fetched}/{total} board games fetched. "
+                          f"Throughput: {rate_limiter.achieved_rate():.2f} requests/sec.")
+    finally:
+        planner.save()
+        print(f"{rejected} batches rejected with status code 414. "
+              f"Longest accepted URL: {planner.max_accepted} characters.")
+
+    return uploaded
+
+def to_listing_numbers(df):
+    "Converts the scraped listing fields to numbers, values such as 'N/A' become NaN."
+
+    return df[listing_fields].apply(
+        lambda column: pd.to_numeric(column.astype(str).str.replace(',', ''), errors='coerce'))
+
+def select_delta(df_listing, df_snapshot, today, thresholds, refresh_days):
+    """Selects the board games whose full details need to be fetched again.
+
+    Parameters:
+        df_listing {dataframe} -- freshly scraped listing with the bgg_id, geek_rating, \
+            avg_rating, and num_voters of each board game.
+        df_snapshot {dataframe} -- listing fields of each board game at the time its details \
+            were last fetched, including the fetched_date.
+        today {date} -- date of the current run.
+        thresholds {dict} -- minimum change of each listing field to fetch a board game again, \
+            num_voters is compared relative to the previous number of voters.
+        refresh_days {int} -- days after which a board game is fetched even without changes.
+
+    Returns:
+        {series} -- boolean mask of the listing rows that are new, changed, or due for refresh.
+    """
+
+    previous = df_listing[['bgg_id']].merge(df_snapshot, on='bgg_id', how='left')
+    new_values = to_listing_numbers(df_listing).reset_index(drop=True)
+    old_values = to_listing_numbers(previous)
 
-        s3_client = initialize_aws_role_and_s3(access_key, secret_key, aws_region, role_arn)
-        n, no_of_bg = 0, 1200 #More than 1200 games per API call will result to 414 status code
+    is_new = previous['fetched_date'].isna()
+    is_stale = pd.to_datetime(previous['fetched_date']) <= pd.Timestamp(today) - pd.Timedelta(days=refresh_days)
+    is_changed = (new_values.isna() != old_values.isna()).any(axis=1)
 
-        while n < df_bgg.shape[0]:
+    for field, threshold in thresholds.items():
+        change = (new_values[field] - old_values[field]).abs()
+        if field == 'num_voters':
+            change = change / old_values[field].clip(lower=1)
+        is_changed |= change > threshold
 
-            url = 'https://boardgamegeek.com/xmlapi2/thing?id=' + \
-            ','.join(df_bgg['bgg_id'][n:n + no_of_bg]) + '&stats=1'
+    return (is_new | is_stale | is_changed).set_axis(df_listing.index)
 
-            response = request_connection(url)
+def update_snapshot(df_listing, df_snapshot, fetched_ids, today):
+    """Stores the listing fields of the fetched board games for the next delta run.
 
-            if response.status_code == 414:
-                no_of_bg -= 100 #reduce board games by 100
-                continue
+    Parameters:
+        df_listing {dataframe} -- freshly scraped listing of board games.
+        df_snapshot {dataframe} -- listing fields of each board game at the time its details \
+            were last fetched.
+        fetched_ids {list} -- board game IDs uploaded during the current run.
+        today {date} -- date of the current run.
+
+    Returns:
+        {dataframe} -- snapshot of the board games that are still in the listing.
+    """
 
-            file_name = f"{n}-{n + no_of_bg}"
-            upload_xml_to_s3(response, s3_client, bucket_name, bucket_key, file_name)
+    fetched = df_listing[df_listing['bgg_id'].isin(fetched_ids)][['bgg_id'] + listing_fields].copy()
+    fetched['fetched_date'] = today.strftime("%Y-%m-%d")
+
+    unchanged = df_snapshot[df_snapshot['bgg_id'].isin(df_listing['bgg_id']) \
+                            & ~df_snapshot['bgg_id'].isin(fetched_ids)]
+
+    if unchanged.empty:
+        return fetched.reset_index(drop=True)
+
+    return pd.concat([unchanged, fetched], ignore_index=True)
+
+def main():
+    "Main driver function."
+
+    try:
 
-            n += no_of_bg
+        if s3_local_root:
+            s3_client = LocalS3Client(s3_local_root)
+        else:
+            s3_client = initialize_aws_role_and_s3(access_key, secret_key, aws_region, role_arn)
+
+        run = start_run(api_state_path, datetime.today(), resume_run, delta_mode)
+        run_date = datetime.strptime(run['run_date'], '%Y-%m-%d')
+        bgg_ids = df_bgg['bgg_id']
+
+        if delta_mode:
+            df_snapshot = pd.read_csv(snapshot_path, dtype={'bgg_id':str}) if os.path.exists(snapshot_path) \
+                else pd.DataFrame(columns=['bgg_id'] + listing_fields + ['fetched_date'])
+            bgg_ids = df_bgg['bgg_id'][select_delta(df_bgg, df_snapshot, run_date.date(),
+                                                    delta_thresholds, full_refresh_days)]
+            print(f"Delta mode. {len(bgg_ids)}/{df_bgg.shape[0]} board games are new, changed, "
+                  f"or older than {full_refresh_days} days.")
+
+        rate_limiter = TokenBucket(rate=requests_per_sec)
+        planner = BatchPlanner(bgg_ids, api_state_path)
+        session = CachedSession(ResponseCache(cache_dir, cache_ttl, cache_max_bytes) if cache_dir else None,
+                                pool_size=max_workers)
+        retry_policy = RetryPolicy(max_attempts=max_attempts, base_delay=backoff_base, max_delay=backoff_max)
+
+        manifest = RunManifest(os.path.join(manifest_dir, f"{run['run_id']}.jsonl"), bgg_ids)
+
+        start_time = time.monotonic()
+        uploaded = fetch_batches(s3_client, max_workers, rate_limiter, planner, manifest, session,
+                                 retry_policy, file_prefix=delta_file_prefix if delta_mode else "", run_date=run_date)
+        elapsed = time.monotonic() - start_time
+
+        if delta_mode:
+            update_snapshot(df_bgg, df_snapshot, list(bgg_ids), run_date).to_csv(snapshot_path, index=False)
+
+        save_api_state(api_state_path, run=None) #the run is complete and is not resumed
+
+        print(f"{uploaded} batches uploaded in {elapsed:.0f} seconds "
+              f"({rate_limiter.acquired} requests, {rate_limiter.achieved_rate():.2f} requests/sec).")
+        print(f"Response cache: {session.stats()}")
+        print(f"Requests: {retry_policy.stats()}")
 
     except Exception as e:
         print("Error occured. Stopping script.")
@@ -0,0 +1,238 @@
+import os
+import uuid
+import shutil
+import argparse
+from datetime import date
+
+from bgg_lambda import cast_to_catalog
+from bgg_storage import get_backend
+
+#compaction parameters
+compaction_row_group_size = int(os.getenv("BGG_COMPACTION_ROW_GROUP_SIZE", "65536"))
+compaction_max_rows_per_file = int(os.getenv("BGG_COMPACTION_MAX_ROWS_PER_FILE", "1000000"))
+compaction_min_files = int(os.getenv("BGG_COMPACTION_MIN_FILES", "2"))
+partitions = ['date', 'type']
+
+
+def split_uri(uri):
+    "Returns the pyarrow file system and the path inside it of a local path or an s3:// URI of the storage backend."
+
+    from pyarrow import fs
+
+    if uri.startswith('s3://') and get_backend().name == "s3":
+        return fs.S3FileSystem(), uri[len('s3://'):].rstrip('/')
+
+    return fs.LocalFileSystem(), os.path.abspath(get_backend().local_path(uri))
+
+def discover_partitions(path):
+    """Lists the date and type partitions of a local dataset from its directory names.
+
+    Parameters:
+        path {string} -- local directory of the dataset.
+
+    Returns:
+        {dict} -- location of each partition, keyed by its date and type values.
+    """
+
+    found = {}
+
+    for date_dir in sorted(os.listdir(path)):
+        if not date_dir.startswith('date='):
+            continue
+        for type_dir in sorted(os.listdir(os.path.join(path, date_dir))):
+            if type_dir.startswith('type='):
+                values = (date_dir[len('date='):], type_dir[len('type='):])
+                found[values] = os.path.join(path, date_dir, type_dir)
+
+    return found
+
+def list_parquet_files(filesystem, location):
+    "Lists the Parquet files of a partition, skipping hidden files such as _SUCCESS."
+
+    from pyarrow import fs
+
+    infos = filesystem.get_file_info(fs.FileSelector(location, allow_not_found=True))
+
+    return sorted(info.path for info in infos
+                  if info.type == fs.FileType.File and not info.base_name.startswith(('.', '_'))
+                  and info.base_name.endswith('.parquet'))
+
+def read_partition(filesystem, files, schema=None):
+    """Reads the small files of a partition into one table. The files may have been written \
+        by different writers, so dictionary columns are decoded and every file is cast to the \
+        same schema.
+
+    Parameters:
+        filesystem {FileSystem} -- pyarrow file system of the files.
+        files {list} -- paths of the Parquet files.
+        schema {Schema} -- schema of the compacted files, that of the last file if not given.
+
+    Returns:
+        {Table} -- rows of all the files.
+    """
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tables = []
+
+    for file_path in files:
+        table = pq.read_table(file_path, filesystem=filesystem)
+        decoded = [column.cast(column.type.value_type) if pa.types.is_dictionary(column.type) else column
+                   for column in table.columns]
+        tables.append(pa.table(decoded, names=table.column_names))
+
+    schema = schema or tables[-1].schema
+
+    return pa.concat_tables([table.select(schema.names).cast(schema) for table in tables])
+
+def sort_by_bgg_id(table):
+    "Sorts the rows by the numeric value of bgg_id so readers can skip row groups by ID."
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    bgg_id = table.column('bgg_id')
+
+    try:
+        sort_key = pc.cast(bgg_id, pa.int64()) if pa.types.is_string(bgg_id.type) else bgg_id
+    except pa.ArrowInvalid:
+        sort_key = bgg_id
+
+    return table.take(pc.sort_indices(sort_key))
+
+def write_compacted(filesystem, table, location, row_group_size, max_rows_per_file):
+    """Writes the sorted rows into as few files as possible.
+
+    Parameters:
+        filesystem {FileSystem} -- pyarrow file system of the location.
+        table {Table} -- sorted rows of the partition.
+        location {string} -- directory of the compacted files.
+        row_group_size {int} -- maximum rows per row group.
+        max_rows_per_file {int} -- maximum rows per file.
+
+    Returns:
+        {list} -- paths of the written files.
+    """
+
+    import pyarrow.parquet as pq
+
+    filesystem.create_dir(location, recursive=True)
+    files = []
+
+    for part, offset in enumerate(range(0, table.num_rows, max_rows_per_file)):
+        file_path = f"{location}/part-{part:05d}.snappy.parquet"
+        pq.write_table(table.slice(offset, max_rows_per_file), file_path, filesystem=filesystem,
+                       compression='snappy', row_group_size=row_group_size)
+        files.append(file_path)
+
+    return files
+
+def compact_dataset(path, glue_database=None, glue_table=None, before=None,
+                    row_group_size=compaction_row_group_size,
+                    max_rows_per_file=compaction_max_rows_per_file,
+                    min_files=compaction_min_files, keep_source=False):
+    """Merges the small files of each closed partition into a few files sorted by bgg_id.
+
+    Datasets registered in the catalog are compacted into a new prefix, \
+    {path}_compacted/<run ID>/date=.../type=.../, and the catalog partition is then pointed to \
+    it, so queries see either the old or the new files and never both. Local directories \
+    without a table are compacted next to the partition directory and swapped in with renames.
+
+    Parameters:
+        path {string} -- s3:// URI or local path of the dataset, e.g. the s3_output_path of a \
+            Lambda. s3:// URIs are stored in S3 or in the local backend.
+        glue_database {string} -- database of the table, required for s3:// URIs.
+        glue_table {string} -- table of the dataset in the catalog of the storage backend, \
+            required for s3:// URIs.
+        before {string} -- partitions with an earlier date are closed, today if not given. \
+            The Lambda functions only append to the partition of the current date.
+        row_group_size {int} -- maximum rows per row group.
+        max_rows_per_file {int} -- maximum rows per compacted file.
+        min_files {int} -- partitions with fewer files are left as they are.
+        keep_source {bool} -- keeps the small files, e.g. while queries may still read them.
+
+    Returns:
+        {list} -- dictionary of the files before and after, and the rows of each compacted \
+            partition.
+    """
+
+    catalog = get_backend().catalog
+    managed = bool(glue_database and glue_table)
+    before = before or date.today().strftime("%Y-%m-%d")
+    run_id = uuid.uuid4().hex[:12]
+
+    if path.startswith('s3://') and not managed:
+        raise ValueError("s3:// datasets are swapped through the catalog, glue_database and glue_table are required.")
+
+    filesystem, _ = split_uri(path)
+    locations = catalog.get_partitions(glue_database, glue_table) if managed else discover_partitions(path)
+    summary = []
+
+    for values, location in sorted(locations.items()):
+
+        if values[0] >= before:
+            continue
+
+        _, location_path = split_uri(location)
+        files = list_parquet_files(filesystem, location_path)
+        if len(files) < min_files:
+            continue
+
+        table = read_partition(filesystem, files)
+        if managed:
+            table = cast_to_catalog(table, catalog.get_table(glue_database, glue_table))
+        table = sort_by_bgg_id(table)
+
+        partition_dirs = [f"{name}={value}" for name, value in zip(partitions, values)]
+
+        if managed:
+            new_uri = '/'.join([path.rstrip('/') + '_compacted', run_id] + partition_dirs)
+            _, new_location = split_uri(new_uri)
+            compacted = write_compacted(filesystem, table, new_location, row_group_size, max_rows_per_file)
+            catalog.update_partition_location(glue_database, glue_table, values, f"{new_uri}/")
+        else:
+            #hidden directories are ignored when the dataset is read, so only the swap is visible
+            parent, name = os.path.split(location_path)
+            new_location = os.path.join(parent, f".{name}.compacting-{run_id}")
+            old_location = os.path.join(parent, f".{name}.old-{run_id}")
+            written = write_compacted(filesystem, table, new_location, row_group_size, max_rows_per_file)
+            os.rename(location_path, old_location)
+            os.rename(new_location, location_path)
+            compacted = [os.path.join(location_path, os.path.basename(file_path)) for file_path in written]
+            files = [os.path.join(old_location, os.path.basename(file_path)) for file_path in files]
+
+        if not keep_source:
+            if managed:
+                for file_path in files:
+                    filesystem.delete_file(file_path)
+            else:
+                shutil.rmtree(old_location)
+
+        print(f"Compacted {'/'.join(partition_dirs)}: {len(files)} files -> {len(compacted)} files, {table.num_rows} rows.")
+        summary.append({"partition": dict(zip(partitions, values)), "files_before": len(files),
+                        "files_after": len(compacted), "rows": table.num_rows})
+
+    return summary
+
+def main():
+    "Main function python script."
+
+    parser = argparse.ArgumentParser(description="Compacts the small Parquet files of the transformed datasets.")
+    parser.add_argument('path', help="S3 or local path of the dataset")
+    parser.add_argument('--glue-database')
+    parser.add_argument('--glue-table')
+    parser.add_argument('--before', help="only partitions with an earlier date (YYYY-MM-DD) are compacted, default today")
+    parser.add_argument('--row-group-size', type=int, default=compaction_row_group_size)
+    parser.add_argument('--max-rows-per-file', type=int, default=compaction_max_rows_per_file)
+    parser.add_argument('--min-files', type=int, default=compaction_min_files)
+    parser.add_argument('--keep-source', action='store_true', help="keeps the small files after the swap")
+    args = parser.parse_args()
+
+    summary = compact_dataset(args.path, args.glue_database, args.glue_table, args.before,
+                              args.row_group_size, args.max_rows_per_file, args.min_files, args.keep_source)
+
+    print(f"Compacted {len(summary)} partitions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+from lxml import etree, html as lxml_html
+from bs4 import BeautifulSoup
+
+
+def has_class(name):
+    "Returns an XPath condition that matches elements with a class token."
+
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+xpaths = {
+    "listing_rows": etree.XPath(f"(//table[{has_class('collection_table')}])[1]//tr[position() > 1]"),
+    "cells": etree.XPath(".//td"),
+    "primary_link": etree.XPath(f"(.//a[{has_class('primary')}])[1]"),
+    "year": etree.XPath("(.//span[@class='smallerfont dull'])[1]"),
+    "meta_description": etree.XPath("(//meta[@name='description'])[1]/@content"),
+}
+
+
+def parse_listing_page(html):
+    """Parses the board games of a BoardGameGeek 'All Boardgames' Web page using lxml and \
+        precompiled XPath expressions.
+
+    Parameters:
+        html {string} -- HTML source of the 'All Boardgames' Web page.
+
+    Returns:
+        {list} -- contains a dictionary of the board game features such as rank, id, title, \
+            and rating for each row of the page.
+    """
+
+    board_games = []
+    tree = lxml_html.fromstring(html)
+
+    for row in xpaths["listing_rows"](tree):
+
+        row_data = [data.text_content().strip() for data in xpaths["cells"](row)]
+        primary_link = xpaths["primary_link"](row)
+        year_tag = xpaths["year"](row)
+
+        #rows without the expected columns or title link are skipped
+        if len(row_data) < 7 or not primary_link:
+            continue
+
+        href = primary_link[0].get('href', '').split('/')
+        if len(href) < 3:
+            continue
+
+        board_games.append({
+            "board_game_rank":row_data[0],
+            "bgg_id":href[2],
+            "title":primary_link[0].text_content(),
+            "year":year_tag[0].text_content()[1:5] if year_tag else "N/A",
+            "geek_rating":row_data[4],
+            "avg_rating":row_data[5],
+            "num_voters":row_data[6],
+        })
+
+    return board_games
+
+def parse_listing_page_soup(html):
+    """Parses the board games of a BoardGameGeek 'All Boardgames' Web page using BeautifulSoup, \
+        kept as the reference for the lxml parser.
+
+    Parameters:
+        html {string} -- HTML source of the 'All Boardgames' Web page.
+
+    Returns:
+        {list} -- contains a dictionary of the board game features such as rank, id, title, \
+            and rating for each row of the page.
+    """
+
+    board_games = []
+    soup = BeautifulSoup(html, 'lxml')
+    table = soup.find('table', class_ = 'collection_table')
+
+    if table is None:
+        return board_games
+
+    for row in table.find_all('tr')[1:]:
+
+        row_data = [data.text.strip() for data in row.find_all('td')]
+        year_tag = row.find('span', class_='smallerfont dull')
+
+        try:
+            bgg_rank = row_data[0]
+            bgg_id = row.find('a', class_ = 'primary').get('href').split('/')[2]
+            title = row.find('a', class_ = 'primary').text
+            year = year_tag.text[1:5] if year_tag is not None else "N/A"
+            geek_rating = row_data[4]
+            avg_rating = row_data[5]
+            num_voters = row_data[6]
+
+            board_games.append({
+                "board_game_rank":bgg_rank,
+                "bgg_id":bgg_id,
+                "title":title,
+                "year":year,
+                "geek_rating":geek_rating,
+                "avg_rating":avg_rating,
+                "num_voters":num_voters,
+            })
+
+        except Exception as e:
+            pass
+
+    return board_games
+
+def parse_link_table(html, table_class='forum_table', base_url='https://boardgamegeek.com'):
+    """Collects the links of the first table with the given class, such as the index of \
+        board game mechanics or categories.
+
+    Parameters:
+        html {string} -- HTML source of the Web page.
+        table_class {string} -- class of the table that contains the links.
+        base_url {string} -- prepended to the relative links.
+
+    Returns:
+        {dict} -- link text mapped to the absolute link.
+    """
+
+    links = {}
+    tree = lxml_html.fromstring(html)
+    table = tree.xpath(f"(//table[{has_class(table_class)}])[1]")
+
+    for link in (table[0].xpath('.//tr//a') if table else []):
+        if link.get('href') is not None:
+            links[link.text_content()] = base_url + link.get('href')
+
+    return links
+
+def parse_meta_description(html):
+    "Returns the content of the description meta tag of a Web page, None if not found."
+
+    content = xpaths["meta_description"](lxml_html.fromstring(html))
+    return content[0] if content else None
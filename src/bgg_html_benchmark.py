@@ -0,0 +1,108 @@
+import glob
+import time
+import argparse
+
+from bgg_html import parse_listing_page, parse_listing_page_soup
+
+parsers = {
+    "beautifulsoup": parse_listing_page_soup,
+    "lxml": parse_listing_page,
+}
+
+
+def synthetic_listing_page(page_number, rows=100):
+    """Builds an 'All Boardgames' Web page with the same table layout as the logged in \
+        BoardGameGeek page of tests/fixtures/html.
+
+    Parameters:
+        page_number {int} -- number of the page, used to number the ranks and IDs.
+        rows {int} -- number of board games in the page.
+
+    Returns:
+        {string} -- HTML source of the page.
+    """
+
+    html = ['<html><head><title>Browse Board Games</title></head><body><div id="maincontent">',
+            '<table class="collection_table" id="collectionitems"><tr><th>Board Game Rank</th>'
+            '<th></th><th>Title</th><th>Your Rating</th><th>Geek Rating</th><th>Avg Rating</th><th>Num Voters</th>'
+            '<th>Shop</th></tr>']
+
+    for i in range(rows):
+        rank = (page_number - 1) * rows + i + 1
+        html.append(
+            f'<tr id="row_"><td class="collection_rank"><a name="{rank}"></a>{rank}</td>'
+            f'<td class="collection_thumbnail"><a href="/boardgame/{rank + 1000}/game-{rank}">'
+            f'<img alt="Board Game: Game {rank}" src="pic{rank}.jpg"/></a></td>'
+            f'<td class="collection_objectname"><div id="results_objectname{i + 1}">'
+            f'<a href="/boardgame/{rank + 1000}/game-{rank}" class="primary">Game {rank}</a>'
+            f'<span class="smallerfont dull">({1990 + rank % 34})</span></div>'
+            f'<p class="smallefont dull">Description of game {rank}.</p></td>'
+            f'<td class="collection_rating">&nbsp;</td>'
+            f'<td class="collection_bggrating">{8.5 - rank / 10000:.3f}</td>'
+            f'<td class="collection_bggrating">{7 + rank % 20 / 10:.2f}</td>'
+            f'<td class="collection_bggrating">{100000 // rank}</td>'
+            f'<td class="collection_shop"><a href="/shop">Shop</a></td></tr>')
+
+    html.append(f'</table><p><a href="/browse/boardgame/page/{page_number + 1}" title="next page">'
+                f'<b>Next &raquo;</b></a></p></div></body></html>')
+
+    return ''.join(html)
+
+def benchmark(pages, repeat):
+    """Measures the pages parsed per second of each listing parser.
+
+    Parameters:
+        pages {list} -- HTML source of each page.
+        repeat {int} -- number of times each page is parsed.
+
+    Returns:
+        {dict} -- pages per second of each parser.
+    """
+
+    results = {}
+
+    for name, parser in parsers.items():
+        start = time.perf_counter()
+
+        for _ in range(repeat):
+            for page in pages:
+                parser(page)
+
+        results[name] = len(pages) * repeat / (time.perf_counter() - start)
+
+    return results
+
+def main():
+    "Main function python script."
+
+    parser = argparse.ArgumentParser(description="Benchmark of the 'All Boardgames' page parsers.")
+    parser.add_argument('--fixtures', default='tests/fixtures/html/*.html',
+                        help="glob of saved 'All Boardgames' pages, those of the tests by default")
+    parser.add_argument('--synthetic', type=int, default=20,
+                        help="number of generated pages used when no fixtures are found")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pages = []
+    for path in sorted(glob.glob(args.fixtures)):
+        with open(path, encoding='utf-8') as f:
+            pages.append(f.read())
+
+    if not pages:
+        print(f"No fixtures found in {args.fixtures}, using {args.synthetic} synthetic pages.")
+        pages = [synthetic_listing_page(n) for n in range(1, args.synthetic + 1)]
+
+    #both parsers have to produce the same rows before comparing their speed
+    for page in pages:
+        if parse_listing_page(page) != parse_listing_page_soup(page):
+            raise ValueError("The lxml and BeautifulSoup parsers returned different rows.")
+
+    results = benchmark(pages, args.repeat)
+
+    for name, pages_per_sec in results.items():
+        print(f"{name}: {pages_per_sec:.1f} pages/sec")
+
+    print(f"Speedup: {results['lxml'] / results['beautifulsoup']:.1f}x")
+
+if __name__ == "__main__":
+    main()
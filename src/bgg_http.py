@@ -0,0 +1,480 @@
+import os
+import json
+import time
+import random
+import collections
+import email.utils
+import hashlib
+import threading
+import urllib.parse
+
+import requests
+
+
+class TokenBucket:
+    """Thread-safe token bucket that paces outgoing requests to a target rate.
+
+    Parameters:
+        rate {float} -- number of tokens added to the bucket per second.
+        capacity {int} -- maximum number of tokens that can be accumulated for bursts.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.acquired = 0
+        self.started = time.monotonic()
+        self.last_refill = self.started
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Blocks until the requested number of tokens are available and consumes them.
+
+        Parameters:
+            tokens {int} -- number of tokens needed by the caller.
+
+        Returns:
+            {None} -- function returns no value once the tokens have been consumed.
+        """
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    self.acquired += tokens
+                    return
+
+                wait_time = (tokens - self.tokens) / self.rate
+
+            time.sleep(wait_time)
+
+    def achieved_rate(self):
+        "Returns the average number of tokens consumed per second since the bucket was created."
+
+        elapsed = time.monotonic() - self.started
+        return self.acquired / elapsed if elapsed > 0 else 0.0
+
+
+def normalize_url(url):
+    "Lowercases the scheme and host of a URL, sorts its query parameters, and drops the fragment."
+
+    parts = urllib.parse.urlsplit(url)
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)),
+                                   safe=',')
+
+    return urllib.parse.urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+
+class CachedResponse:
+    """Response served from the on-disk cache with the same interface used from requests.Response.
+
+    Parameters:
+        url {string} -- URL of the cached response.
+        body_path {string} -- file containing the cached response body.
+        headers {dict} -- cached response headers.
+    """
+
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, url, body_path, headers):
+        self.url = url
+        self.body_path = body_path
+        self.headers = headers
+
+    def iter_content(self, chunk_size=64 * 1024):
+        "Yields the cached body in chunks without loading the whole file in memory."
+
+        with open(self.body_path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    @property
+    def content(self):
+        with open(self.body_path, 'rb') as f:
+            return f.read()
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache of successful HTTP responses keyed by the normalized URL \
+        with time-to-live expiration and least-recently-used eviction by total size.
+
+    Parameters:
+        cache_dir {string} -- directory where the response bodies and metadata are stored.
+        ttl {int} -- seconds after which a cached response has to be revalidated.
+        max_bytes {int} -- maximum total size of the cached bodies.
+    """
+
+    def __init__(self, cache_dir, ttl=86400, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(os.path.getsize(os.path.join(cache_dir, name))
+                               for name in os.listdir(cache_dir) if name.endswith('.body'))
+
+    def paths(self, url):
+        "Returns the body and metadata file paths of a URL."
+
+        digest = hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, digest)
+
+        return base + '.body', base + '.json'
+
+    def lookup(self, url):
+        """Finds the cached entry of a URL and marks it as recently used.
+
+        Parameters:
+            url {string} -- requested URL.
+
+        Returns:
+            {dict} -- metadata of the cached response including whether it is still fresh, \
+                None if the URL is not cached.
+        """
+
+        body_path, meta_path = self.paths(url)
+
+        try:
+            with open(meta_path) as f:
+                entry = json.load(f)
+            os.utime(meta_path) #last access time used for eviction
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        entry['fresh'] = time.time() - entry['stored_at'] < self.ttl
+        entry['body_path'] = body_path
+
+        return entry
+
+    def store(self, url, response):
+        """Streams a response body into the cache and evicts the least recently used entries \
+            when the cache is full.
+
+        Parameters:
+            url {string} -- requested URL.
+            response {Response} -- successful response whose body has not been read yet.
+
+        Returns:
+            {CachedResponse} -- response served from the newly cached body.
+        """
+
+        body_path, meta_path = self.paths(url)
+        tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+
+        headers = {name: response.headers[name] for name in ('ETag', 'Last-Modified', 'Content-Type')
+                   if name in response.headers}
+
+        with self.lock:
+            old_size = os.path.getsize(body_path) if os.path.exists(body_path) else 0
+            os.replace(tmp_path, body_path)
+            self.total_bytes += os.path.getsize(body_path) - old_size
+
+            with open(meta_path, 'w') as f:
+                json.dump({'url':normalize_url(url), 'stored_at':time.time(), 'headers':headers}, f)
+
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+        return CachedResponse(url, body_path, headers)
+
+    def refresh(self, url):
+        "Restarts the time-to-live of a cached entry after the server confirmed it is unchanged."
+
+        _, meta_path = self.paths(url)
+
+        with open(meta_path) as f:
+            entry = json.load(f)
+        entry['stored_at'] = time.time()
+
+        with open(meta_path, 'w') as f:
+            json.dump(entry, f)
+
+    def evict(self):
+        "Deletes the least recently used entries until the cache fits its maximum size."
+
+        entries = sorted((os.path.getmtime(os.path.join(self.cache_dir, name)), name[:-5])
+                         for name in os.listdir(self.cache_dir) if name.endswith('.json'))
+
+        for _, digest in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+
+            body_path = os.path.join(self.cache_dir, digest + '.body')
+            self.total_bytes -= os.path.getsize(body_path) if os.path.exists(body_path) else 0
+
+            for path in (body_path, os.path.join(self.cache_dir, digest + '.json')):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+class CachedSession:
+    """Pooled keep-alive requests.Session with an optional on-disk response cache that sends \
+        conditional requests for expired entries.
+
+    Parameters:
+        cache {ResponseCache} -- on-disk cache of responses, None to disable caching.
+        pool_size {int} -- maximum number of connections kept alive per host.
+    """
+
+    def __init__(self, cache=None, pool_size=10):
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.hits, self.misses, self.revalidated = 0, 0, 0
+        self.lock = threading.Lock()
+
+    def count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, url, rate_limiter=None, **kwargs):
+        """Returns the cached response of a URL or requests it from the server.
+
+        Parameters:
+            url {string} -- requested URL.
+            rate_limiter {TokenBucket} -- paces the requests that reach the server, cache \
+                hits are served without consuming tokens.
+
+        Returns:
+            {Response} -- requests.Response for uncached errors, CachedResponse otherwise.
+        """
+
+        entry = self.cache.lookup(url) if self.cache is not None else None
+
+        if entry is not None and entry['fresh']:
+            self.count('hits')
+            return CachedResponse(url, entry['body_path'], entry['headers'])
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry is not None:
+            if 'ETag' in entry['headers']:
+                headers['If-None-Match'] = entry['headers']['ETag']
+            if 'Last-Modified' in entry['headers']:
+                headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+
+        kwargs['stream'] = True
+        response = self.session.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            response.close()
+            self.cache.refresh(url)
+            self.count('revalidated')
+            return CachedResponse(url, entry['body_path'], entry['headers'])
+
+        self.count('misses')
+
+        if self.cache is None or response.status_code != 200:
+            return response
+
+        with response:
+            return self.cache.store(url, response)
+
+    def stats(self):
+        "Returns the number of cache hits, misses, and revalidated entries."
+
+        return {'hits':self.hits, 'misses':self.misses, 'revalidated':self.revalidated}
+
+
+class RetryPolicy:
+    """Schedules retries of failed requests with exponential backoff and jitter, honours the \
+        Retry-After header, polls queued (202) requests, and keeps per-status counters and \
+        latency histograms.
+
+    Parameters:
+        max_attempts {int} -- maximum number of failed attempts per request before giving up.
+        base_delay {float} -- backoff in seconds after the first failed attempt.
+        max_delay {float} -- upper limit in seconds of any single wait.
+        poll_interval {float} -- seconds between polls of a request queued by the server.
+        max_polls {int} -- maximum number of polls of a queued request.
+        sleep {function} -- function used to wait, replaceable for testing.
+    """
+
+    retry_statuses = {429, 500, 502, 503, 504}
+    latency_buckets = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+    def __init__(self, max_attempts=8, base_delay=1.0, max_delay=60.0, poll_interval=2.0, max_polls=30,
+                 sleep=time.sleep):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.max_polls = max_polls
+        self.sleep = sleep
+
+        self.status_counts = collections.Counter()
+        self.latency_histogram = collections.Counter()
+        self.lock = threading.Lock()
+
+    def record(self, status, latency):
+        """Counts the outcome of an attempt and adds its latency to the histogram.
+
+        Parameters:
+            status {int or string} -- HTTP status code, or the exception name if the request failed.
+            latency {float} -- seconds until the response headers were received.
+
+        Returns:
+            {None} -- function returns no value.
+        """
+
+        bucket = next((f"<={bound}s" for bound in self.latency_buckets if latency <= bound),
+                      f">{self.latency_buckets[-1]}s")
+
+        with self.lock:
+            self.status_counts[status] += 1
+            self.latency_histogram[bucket] += 1
+
+    def retry_after(self, response):
+        "Returns the seconds requested by the Retry-After header of a response, None if absent."
+
+        value = response.headers.get('Retry-After') if response is not None else None
+
+        if value is None:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                retry_date = email.utils.parsedate_to_datetime(value)
+                return max(0.0, retry_date.timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+
+    def backoff(self, attempt, response=None):
+        """Computes the wait before the next attempt using full-jitter exponential backoff, \
+            unless the server asked for a specific wait.
+
+        Parameters:
+            attempt {int} -- number of failed attempts so far.
+            response {Response} -- last response received, if any.
+
+        Returns:
+            {float} -- seconds to wait before the next attempt.
+        """
+
+        retry_after = self.retry_after(response)
+
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def poll_delay(self, response=None):
+        "Returns the wait before polling a queued request again."
+
+        retry_after = self.retry_after(response)
+
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+
+        return self.poll_interval * random.uniform(0.8, 1.2)
+
+    def stats(self):
+        "Returns the number of attempts per status and the latency histogram."
+
+        with self.lock:
+            return {'status_counts':dict(self.status_counts),
+                    'latency_histogram':dict(self.latency_histogram)}
+
+
+class RetryBudgetExceeded(Exception):
+    "Raised when a request keeps failing after all attempts allowed by the retry policy."
+
+
+def send_with_retries(url, retry_policy, rate_limiter=None, session=None):
+    """Sends a GET request following a retry policy until a final response is received.
+
+    Parameters:
+        url {string} -- the endpoint and query parameters of the target API.
+        retry_policy {RetryPolicy} -- decides the waits and attempt budget, and collects statistics.
+        rate_limiter {TokenBucket} -- optional token bucket that paces every attempt.
+        session {CachedSession} -- optional pooled session, a bare requests.get is used if not given.
+
+    Returns:
+        {Response} -- response with status code 200, or any other status code that should not \
+            be retried such as 414, with the content not read yet.
+    """
+
+    attempts, polls = 0, 0
+
+    while True:
+        response = None
+        started = time.monotonic()
+
+        try:
+            if session is not None:
+                response = session.get(url, rate_limiter=rate_limiter)
+            else:
+                if rate_limiter is not None:
+                    rate_limiter.acquire()
+                response = requests.get(url, stream=True)
+
+            status = response.status_code
+            retry_policy.record(status, time.monotonic() - started)
+
+        except requests.RequestException as e:
+            retry_policy.record(type(e).__name__, time.monotonic() - started)
+            status = None
+
+            if attempts + 1 >= retry_policy.max_attempts:
+                raise
+
+        if status == 202:
+            #request queued by the server, poll again without spending the attempt budget
+            response.close()
+            polls += 1
+
+            if polls > retry_policy.max_polls:
+                raise RetryBudgetExceeded(f"Request still queued after {polls - 1} polls: {url}")
+
+            retry_policy.sleep(retry_policy.poll_delay(response))
+            continue
+
+        if status is not None and status not in retry_policy.retry_statuses:
+            return response
+
+        attempts += 1
+
+        if response is not None:
+            response.close()
+
+        if attempts >= retry_policy.max_attempts:
+            raise RetryBudgetExceeded(f"Status code {status} after {attempts} attempts: {url}")
+
+        delay = retry_policy.backoff(attempts, response)
+        print(f"Status code: {status}. Retrying to connect in {delay:.1f} seconds.")
+        retry_policy.sleep(delay)
@@ -0,0 +1,340 @@
+import io
+import os
+import json
+import uuid
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from bgg_storage import catalog_types, delta_file_prefix, get_backend, open_object_stream
+from bgg_xml import build_tables, concat_tables
+
+#batch parameters
+lambda_workers = int(os.getenv("BGG_LAMBDA_WORKERS", "8"))
+lambda_writer = os.getenv("BGG_LAMBDA_WRITER", "arrow") #arrow or wrangler
+partitions= ['date', 'type']
+
+#tables written by each handler module
+handler_tables = {
+    "lambda_details": ["details"],
+    "lambda_classification": ["classification"],
+    "lambda_poll": ["poll"],
+    "lambda_flatten": ["details", "classification", "poll"],
+}
+
+
+def handler_config(tables):
+    """Reads the output configuration of a handler from the environment when it is invoked \
+        rather than when it is imported.
+
+    Parameters:
+        tables {list} -- tables written by the handler. The path and Glue table of each are read \
+            from <table>_output_path and <table>_glue_table, or from s3_output_path and \
+            glue_table for a handler that writes a single table.
+
+    Returns:
+        {tuple} -- outputs, Glue database, and mode of operation for process_batch.
+    """
+
+    single = len(tables) == 1
+    outputs = {table: {
+        "path": os.environ[f'{table}_output_path'] if f'{table}_output_path' in os.environ or not single
+            else os.environ['s3_output_path'],
+        "table": os.environ[f'{table}_glue_table'] if f'{table}_glue_table' in os.environ or not single
+            else os.environ['glue_table'],
+    } for table in tables}
+
+    return outputs, os.environ['glue_database'], os.environ['mode_operation']
+
+def iter_s3_records(event):
+    """Collects the S3 objects of every record of an SNS or SQS event. SQS messages may contain \
+        the S3 event itself or the SNS notification that wraps it.
+
+    Parameters:
+        event {dict} -- event received by the Lambda function.
+
+    Returns:
+        {list} -- tuples of record ID, bucket, and key of each S3 object. The record ID is the \
+            SQS message ID or the SNS message ID.
+    """
+
+    s3_records = []
+
+    for record in event.get('Records', []):
+
+        if record.get('eventSource') == 'aws:sqs':
+            record_id = record['messageId']
+            message = json.loads(record['body'])
+            if 'Message' in message:
+                message = json.loads(message['Message'])
+        else:
+            record_id = record['Sns'].get('MessageId')
+            message = json.loads(record['Sns']['Message'])
+
+        #S3 test events and other messages without records are ignored
+        for s3_record in message.get('Records', []):
+            bucket = s3_record['s3']['bucket']['name']
+            key = urllib.parse.unquote_plus(s3_record['s3']['object']['key'], encoding='utf-8')
+            s3_records.append((record_id, bucket, key))
+
+    return s3_records
+
+def sns_event(bucket, keys, message_id=None):
+    """Builds the SNS event that S3 sends for new objects, with the keys URL-encoded like S3 \
+        does, so iter_s3_records decodes keys with spaces or plus signs back to the same keys.
+
+    Parameters:
+        bucket {string} -- bucket of the objects.
+        keys {list} -- keys of the new objects.
+        message_id {string} -- SNS message ID, derived from the first key if not given.
+
+    Returns:
+        {dict} -- event with a single SNS record.
+    """
+
+    message = {"Records": [{"s3": {"bucket": {"name": bucket}, "object": {"key": urllib.parse.quote_plus(key)}}}
+                           for key in keys]}
+    return {"Records": [{"Sns": {"MessageId": message_id or f"local-{keys[0]}", "Message": json.dumps(message)}}]}
+
+def cast_to_catalog(arrow_table, catalog_table):
+    "Casts the columns of an Arrow table to the column types of the Glue table."
+
+    import pyarrow as pa
+
+    columns = {column['Name']: column['Type'] for column in catalog_table['StorageDescriptor']['Columns']}
+    fields = []
+
+    for field in arrow_table.schema:
+        catalog_type = catalog_types.get(columns.get(field.name))
+        if catalog_type is None or pa.types.is_dictionary(field.type):
+            fields.append(field)
+        else:
+            fields.append(pa.field(field.name, pa.type_for_alias(catalog_type)))
+
+    return arrow_table.cast(pa.schema(fields))
+
+def arrow_columns(arrow_table):
+    "Returns the Glue type of each column of an Arrow table, dictionary columns are strings."
+
+    import pyarrow as pa
+
+    #keyed by type rather than by name, str(pa.float64()) is 'double' and not 'float64'
+    glue_types = {pa.type_for_alias(pyarrow_type): glue_type for glue_type, pyarrow_type in catalog_types.items()}
+
+    return {field.name: glue_types.get(field.type.value_type if pa.types.is_dictionary(field.type)
+                                       else field.type, "string")
+            for field in arrow_table.schema}
+
+def write_table_arrow(columnar_tables, output, glue_database):
+    """Writes a table with pyarrow, one Parquet file per partition, and registers the new \
+        partitions in the catalog of the storage backend. Output paths that are not s3:// URIs \
+        are written to the local file system without the catalog.
+
+    Parameters:
+        columnar_tables {list} -- ColumnarTable of the table built from each file.
+        output {dict} -- S3 or local path ('path') and Glue table ('table') of the table.
+        glue_database {string} -- Glue database of the table.
+
+    Returns:
+        {dict} -- paths of the written files and the partition values, the same keys as \
+            the response of awswrangler.
+    """
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    backend = get_backend()
+    path = output["path"].rstrip('/')
+    on_s3 = path.startswith('s3://')
+    catalog_table = backend.catalog.get_table(glue_database, output["table"]) if on_s3 else None
+
+    #the date and type columns are constant for a file so the partitions are grouped by file
+    partition_tables = {}
+    for columnar_table in columnar_tables:
+        if columnar_table.num_rows:
+            partition_values = tuple(str(columnar_table.constants[name]) for name in partitions)
+            partition_tables.setdefault(partition_values, []).append(columnar_table)
+
+    paths, partitions_values = [], {}
+
+    for partition_values, partition_columnar_tables in partition_tables.items():
+
+        arrow_table = pa.concat_tables([columnar_table.to_arrow(exclude=partitions)
+                                        for columnar_table in partition_columnar_tables])
+
+        #the local catalog registers the table on its first write, like awswrangler does in Glue
+        if on_s3 and catalog_table is None and backend.name == "local":
+            backend.catalog.create_table(glue_database, output["table"], arrow_columns(arrow_table),
+                                         partitions, f"{path}/")
+            catalog_table = backend.catalog.get_table(glue_database, output["table"])
+
+        if catalog_table is not None:
+            arrow_table = cast_to_catalog(arrow_table, catalog_table)
+
+        location = '/'.join([path] + [f"{name}={value}" for name, value in zip(partitions, partition_values)])
+        file_path = f"{location}/{uuid.uuid4().hex}.snappy.parquet"
+
+        buffer = io.BytesIO()
+        pq.write_table(arrow_table, buffer, compression='snappy')
+
+        if on_s3:
+            bucket, key = file_path[len('s3://'):].split('/', 1)
+            backend.s3.put_object(Body=buffer.getvalue(), Bucket=bucket, Key=key)
+        else:
+            os.makedirs(location, exist_ok=True)
+            with open(file_path, 'wb') as f:
+                f.write(buffer.getvalue())
+
+        paths.append(file_path)
+        partitions_values[f"{location}/"] = list(partition_values)
+
+    if catalog_table is not None and partitions_values:
+        backend.catalog.create_partitions(glue_database, output["table"], partitions_values)
+
+    return {"paths": paths, "partitions_values": partitions_values}
+
+def write_table_wrangler(table, columnar_tables, output, glue_database, mode_operation):
+    "Writes a table with awswrangler, which also creates the Glue table if it does not exist."
+
+    import awswrangler as wr
+
+    df_bgg = concat_tables(table, [columnar_table.to_frame() for columnar_table in columnar_tables])
+
+    return wr.s3.to_parquet(df=df_bgg,
+                            path=output["path"],
+                            dataset=True,
+                            database=glue_database,
+                            table=output["table"],
+                            mode=mode_operation,
+                            partition_cols=partitions)
+
+def delete_written_files(responses):
+    "Deletes the files written for a batch, so a batch that is retried does not add its rows twice."
+
+    backend = get_backend()
+
+    for table, response in responses.items():
+        for file_path in response["paths"]:
+            try:
+                if file_path.startswith('s3://'):
+                    bucket, key = file_path[len('s3://'):].split('/', 1)
+                    backend.s3.delete_object(Bucket=bucket, Key=key)
+                elif os.path.exists(file_path):
+                    os.remove(file_path)
+            except Exception as e:
+                print(f"Error occured while deleting {file_path} of {table}: {e}")
+
+def write_tables(tables, outputs, glue_database, mode_operation, writer=lambda_writer):
+    """Writes each table as a Parquet dataset partitioned by date and type. The pyarrow writer \
+        is used for appends to existing Glue tables, the local backend, and local paths; \
+        awswrangler is imported only for the other cases, such as the first write of a Glue \
+        table or an overwrite. The tables of a batch are written all or none: when a table \
+        fails, the files already written for the other tables are deleted before the error \
+        is raised.
+
+    Parameters:
+        tables {dict} -- list of ColumnarTable of each table.
+        outputs {dict} -- S3 path ('path') and Glue table ('table') of each table.
+        glue_database {string} -- Glue database of the tables.
+        mode_operation {string} -- append, overwrite, or overwrite_partitions.
+        writer {string} -- 'arrow' or 'wrangler'.
+
+    Returns:
+        {dict} -- paths and partitions written for each table that has rows.
+    """
+
+    backend = get_backend()
+    responses = {}
+
+    try:
+        for table, columnar_tables in tables.items():
+
+            if not any(columnar_table.num_rows for columnar_table in columnar_tables):
+                print(f"No {table} rows to write.")
+                continue
+
+            output = outputs[table]
+            on_s3 = output["path"].startswith('s3://')
+
+            if not on_s3 or backend.name == "local" or (writer == "arrow" and mode_operation == "append"
+                    and backend.catalog.get_table(glue_database, output["table"]) is not None):
+                responses[table] = write_table_arrow(columnar_tables, output, glue_database)
+            else:
+                responses[table] = write_table_wrangler(table, columnar_tables, output, glue_database, mode_operation)
+    except Exception:
+        delete_written_files(responses)
+        raise
+
+    return responses
+
+def process_batch(event, outputs, glue_database, mode_operation, max_workers=lambda_workers, s3=None):
+    """Flattens every raw XML file of an SNS or SQS event and writes each table once for the \
+        whole batch, so a batch adds one Parquet file per partition instead of one per file.
+
+    Parameters:
+        event {dict} -- event received by the Lambda function.
+        outputs {dict} -- S3 path ('path') and Glue table ('table') of each table to build.
+        glue_database {string} -- Glue database of the tables.
+        mode_operation {string} -- append, overwrite, or overwrite_partitions.
+        max_workers {int} -- maximum number of files downloaded and parsed at the same time.
+        s3 {client} -- S3 client used to read the raw files, that of the storage backend if \
+            not given.
+
+    Returns:
+        {dict} -- batchItemFailures with the ID of each record whose files could not be \
+            processed, which SQS retries when ReportBatchItemFailures is enabled, the failed \
+            keys, and the rows written to each table. Failures of SNS events are raised \
+            instead, so the invocation is retried.
+    """
+
+    s3 = s3 or get_backend().s3
+    s3_records = iter_s3_records(event)
+    tables = list(outputs)
+
+    def flatten(s3_record):
+        _, bucket, key = s3_record
+        s3_response = s3.get_object(Bucket=bucket, Key=key)
+        xml_data = open_object_stream(s3_response['Body'], key) #parsed while it is downloaded
+        try:
+            return build_tables(xml_data, tables=tables,
+                                delta=os.path.basename(key).startswith(delta_file_prefix))
+        finally:
+            xml_data.close()
+
+    def try_flatten(s3_record):
+        try:
+            return flatten(s3_record)
+        except Exception as e:
+            print(f"Error occured in {s3_record[2]}: {e}")
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(s3_records)))) as executor:
+        results = list(executor.map(try_flatten, s3_records))
+
+    #a record is retried as a whole, so the other files of a record with a failed file are not written
+    failed_ids = {s3_record[0] for s3_record, result in zip(s3_records, results) if isinstance(result, Exception)}
+    failed = [s3_record for s3_record in s3_records if s3_record[0] in failed_ids]
+    flattened = [result for s3_record, result in zip(s3_records, results) if s3_record[0] not in failed_ids]
+    rows = {table: sum(columnar_tables[table].num_rows for columnar_tables in flattened) for table in tables}
+
+    if flattened:
+        try:
+            write_tables({table: [columnar_tables[table] for columnar_tables in flattened]
+                          for table in tables}, outputs, glue_database, mode_operation)
+        except Exception as e:
+            print(f"Error occured while writing the batch: {e}")
+            failed = s3_records #nothing of the batch is kept, see write_tables
+            rows = {table: 0 for table in tables}
+
+    print(f"Processed {len(s3_records) - len(failed)}/{len(s3_records)} files.")
+
+    #only SQS reads batchItemFailures, SNS retries the invocation when the handler raises
+    if failed and not all(record.get('eventSource') == 'aws:sqs' for record in event.get('Records', [])):
+        raise RuntimeError(f"Failed to process {len(failed)}/{len(s3_records)} files: "
+                           f"{', '.join(key for _, _, key in failed)}")
+
+    return {
+        "batchItemFailures": [{"itemIdentifier": record_id}
+                              for record_id in dict.fromkeys(record_id for record_id, _, _ in failed)],
+        "failedKeys": [key for _, _, key in failed],
+        "rows": rows,
+    }
@@ -0,0 +1,140 @@
+import os
+import sys
+import glob
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from bgg_lambda import handler_tables, sns_event
+
+#runs in a new interpreter so every import is cold, like the first invocation of a Lambda container
+probe = """
+import sys
+import json
+import time
+
+start = time.perf_counter()
+import {module} as handler
+imported = time.perf_counter()
+
+event = json.loads(sys.argv[1])
+handler.lambda_handler(event, None)
+first = time.perf_counter()
+handler.lambda_handler(event, None)
+warm = time.perf_counter()
+
+print(json.dumps({{"import": imported - start, "first_invocation": first - imported, "warm_invocation": warm - first}}))
+"""
+
+#what the handlers imported at module level before the heavy imports were deferred
+baseline_probe = """
+import json
+import time
+
+start = time.perf_counter()
+import awswrangler
+import boto3
+boto3.client('s3', region_name='us-east-1')
+print(json.dumps({"import": time.perf_counter() - start}))
+"""
+
+
+def handler_env(module, root):
+    """Builds the environment of a handler that reads the fixtures from a local bucket and \
+        writes the tables to local directories.
+
+    Parameters:
+        module {string} -- name of the handler module.
+        root {string} -- temporary directory of the local bucket and outputs.
+
+    Returns:
+        {dict} -- environment variables of the subprocess.
+    """
+
+    env = dict(os.environ,
+               PYTHONPATH=os.path.dirname(os.path.abspath(__file__)),
+               S3_LOCAL_ROOT=os.path.join(root, 's3'),
+               glue_database='bgg-benchmark',
+               mode_operation='append')
+
+    for table in handler_tables[module]:
+        env[f'{table}_output_path'] = os.path.join(root, 'output', module, table)
+        env[f'{table}_glue_table'] = table
+
+    if len(handler_tables[module]) == 1:
+        env['s3_output_path'] = env[f'{handler_tables[module][0]}_output_path']
+        env['glue_table'] = handler_tables[module][0]
+
+    return env
+
+def run_probe(code, env, *args):
+    "Runs a probe in a new interpreter and returns the timings it prints."
+
+    result = subprocess.run([sys.executable, '-c', code, *args], env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def benchmark(fixtures, repeat):
+    """Measures the cold import time and the first and warm invocation latency of each handler.
+
+    Parameters:
+        fixtures {list} -- raw XML files sent in one event.
+        repeat {int} -- number of cold starts of each handler, the median is reported.
+
+    Returns:
+        {dict} -- median seconds of each measurement for each handler.
+    """
+
+    results = {}
+    root = tempfile.mkdtemp(prefix='bgg_lambda_benchmark_')
+
+    try:
+        bucket_path = os.path.join(root, 's3', 'bgg-raw')
+        os.makedirs(bucket_path)
+        keys = []
+        for path in fixtures:
+            shutil.copy(path, bucket_path)
+            keys.append(os.path.basename(path))
+        event = json.dumps(sns_event('bgg-raw', keys, message_id='benchmark'))
+
+        baseline = [run_probe(baseline_probe, dict(os.environ)) for _ in range(repeat)]
+        results["awswrangler + boto3 (previous module imports)"] = {
+            "import": statistics.median(run["import"] for run in baseline)}
+
+        for module in handler_tables:
+            runs = [run_probe(probe.format(module=module), handler_env(module, root), event)
+                    for _ in range(repeat)]
+            results[module] = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+
+    finally:
+        shutil.rmtree(root)
+
+    return results
+
+def main():
+    "Main function python script."
+
+    parser = argparse.ArgumentParser(description="Benchmark of the cold start of the Lambda handlers.")
+    parser.add_argument('--fixtures', default='data/raw/*.xml', help="glob of raw XML files")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help="JSON file where the results are saved")
+    args = parser.parse_args()
+
+    fixtures = sorted(glob.glob(args.fixtures))
+    if not fixtures:
+        raise FileNotFoundError(f"No fixtures found in {args.fixtures}.")
+
+    results = benchmark(fixtures, args.repeat)
+
+    for name, timings in results.items():
+        print(f"{name}: " + ", ".join(f"{measure} {seconds * 1000:.0f} ms" for measure, seconds in timings.items()))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import os
+import glob
+import json
+import time
+import shutil
+import argparse
+import importlib
+
+from bgg_lambda import handler_tables, sns_event
+
+#local driver parameters
+driver_bucket = "bgg-raw-local"
+driver_output_bucket = "bgg-transformed-local"
+
+
+def configure_local_backend(root, handler, database):
+    """Points the handlers to the local storage backend. Variables that are already set are \
+        kept, so a run can be redirected to other paths or tables.
+
+    Parameters:
+        root {string} -- directory of the local backend.
+        handler {string} -- name of the handler module.
+        database {string} -- database of the local catalog.
+    """
+
+    os.environ.setdefault("BGG_STORAGE_BACKEND", "local")
+    os.environ.setdefault("S3_LOCAL_ROOT", root)
+    os.environ.setdefault("glue_database", database)
+    os.environ.setdefault("mode_operation", "append")
+
+    for table in handler_tables[handler]:
+        os.environ.setdefault(f"{table}_output_path", f"s3://{driver_output_bucket}/{table}/")
+        os.environ.setdefault(f"{table}_glue_table", f"bgg_{table}")
+
+def stage_raw_files(files, root):
+    """Places the raw files in the local bucket, linked when possible to avoid copying them.
+
+    Parameters:
+        files {list} -- paths of the raw XML files.
+        root {string} -- directory of the local backend.
+
+    Returns:
+        {list} -- keys of the staged files.
+    """
+
+    bucket_path = os.path.join(root, driver_bucket)
+    os.makedirs(bucket_path, exist_ok=True)
+    keys = []
+
+    for path in files:
+        key = os.path.basename(path)
+        target = os.path.join(bucket_path, key)
+
+        if not os.path.exists(target):
+            try:
+                os.symlink(os.path.abspath(path), target)
+            except OSError:
+                shutil.copy(path, target)
+
+        keys.append(key)
+
+    return keys
+
+def replay(handler, keys, batch_size):
+    """Invokes the handler with one SNS event per batch of raw files.
+
+    Parameters:
+        handler {module} -- handler module with a lambda_handler function.
+        keys {list} -- keys of the raw files in the local bucket.
+        batch_size {int} -- raw files per event.
+
+    Returns:
+        {dict} -- files, failed keys, rows written to each table, and elapsed seconds.
+    """
+
+    failed_keys, rows = [], {}
+    start = time.perf_counter()
+
+    for i in range(0, len(keys), batch_size):
+        try:
+            response = handler.lambda_handler(sns_event(driver_bucket, keys[i:i + batch_size]), None)
+        except RuntimeError as e:
+            #the batch is a single SNS record, so none of its files are written when one fails
+            print(f"Error occured in batch {i // batch_size}: {e}")
+            failed_keys += keys[i:i + batch_size]
+            continue
+        for table, table_rows in response["rows"].items():
+            rows[table] = rows.get(table, 0) + table_rows
+
+    return {"files": len(keys), "failed_keys": failed_keys, "rows": rows,
+            "seconds": time.perf_counter() - start}
+
+def main():
+    "Main function python script."
+
+    parser = argparse.ArgumentParser(description="Replays the raw XML files through the Lambda handlers "
+                                                 "with the local storage backend.")
+    parser.add_argument('--raw', default='data/raw/*.xml*', help="glob of raw XML files, .gz and .zst included")
+    parser.add_argument('--root', default='data/local_s3', help="directory of the local backend")
+    parser.add_argument('--handler', default='lambda_flatten', choices=list(handler_tables))
+    parser.add_argument('--batch-size', type=int, default=1, help="raw files per SNS event")
+    parser.add_argument('--database', default='bgg-local')
+    parser.add_argument('--output', help="JSON file where the results are saved")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(args.raw))
+    if not files:
+        raise FileNotFoundError(f"No raw files found in {args.raw}.")
+
+    configure_local_backend(args.root, args.handler, args.database)
+    keys = stage_raw_files(files, args.root)
+    raw_bytes = sum(os.path.getsize(path) for path in files)
+
+    handler = importlib.import_module(args.handler)
+    results = replay(handler, keys, args.batch_size)
+    results.update(handler=args.handler, raw_bytes=raw_bytes, batch_size=args.batch_size)
+
+    seconds = results["seconds"]
+    print(f"{args.handler}: {results['files']} files in {seconds:.2f}s, {results['files'] / seconds:.1f} files/sec, "
+          f"{raw_bytes / seconds / 2**20:.1f} MB/sec, {len(results['failed_keys'])} failed.")
+    for table, table_rows in results["rows"].items():
+        print(f"  {table}: {table_rows} rows, {table_rows / seconds:.0f} rows/sec")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+from bgg_xml_synthetic import iter_synthetic_documents
+
+#tables flattened by each benchmarked parser, 'all' is the single pass of lambda_flatten
+parsers = {
+    "details": ["details"],
+    "classification": ["classification"],
+    "poll": ["poll"],
+    "all": ["details", "classification", "poll"],
+}
+
+#runs in a new interpreter so the peak RSS belongs to a single parser and file size
+probe = """
+import sys
+import json
+import time
+import resource
+
+import pandas #imported before the timings so the first file does not pay for them
+import pyarrow
+
+from bgg_xml import build_tables
+
+tables = json.loads(sys.argv[1])
+items = parse_seconds = frame_seconds = arrow_seconds = 0
+
+for path in sys.argv[2:]:
+    with open(path, 'rb') as f:
+        document = f.read()
+
+    start = time.perf_counter()
+    columnar_tables = build_tables(document, tables)
+    parsed = time.perf_counter()
+    frames = [columnar_table.to_frame() for columnar_table in columnar_tables.values()]
+    framed = time.perf_counter()
+    arrow_tables = [columnar_table.to_arrow() for columnar_table in columnar_tables.values()]
+    arrowed = time.perf_counter()
+
+    items += document.count(b'<item ')
+    parse_seconds += parsed - start
+    frame_seconds += framed - parsed
+    arrow_seconds += arrowed - framed
+    del document, columnar_tables, frames, arrow_tables
+
+print(json.dumps({
+    "items": items,
+    "parse_seconds": parse_seconds,
+    "frame_seconds": frame_seconds,
+    "arrow_seconds": arrow_seconds,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+#calls per second of the helpers on the first item of the sample file
+helpers_probe = """
+import sys
+import json
+import timeit
+
+from bgg_xml import iter_items, get_attribute, get_text, poll_vote
+
+with open(sys.argv[1], 'rb') as f:
+    item = next(iter_items(f.read()))
+
+results = item.find('poll').find('results')
+number = 20000
+calls = {
+    "get_attribute": timeit.timeit(lambda: get_attribute(item, 'yearpublished', 'value'), number=number),
+    "get_text": timeit.timeit(lambda: get_text(item, 'description'), number=number),
+    "poll_vote": timeit.timeit(lambda: poll_vote(results), number=number),
+}
+
+print(json.dumps({name: number / seconds for name, seconds in calls.items()}))
+"""
+
+
+def run_probe(code, *args):
+    "Runs a probe in a new interpreter with src on the path and returns the JSON it prints."
+
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', code, *args], env=env,
+                            capture_output=True, text=True, check=True)
+
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def git_commit():
+    "Returns the commit of the working tree, None outside a git repository."
+
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmark(total_items, items_per_file_sizes, seed=0, parser_names=tuple(parsers)):
+    """Measures each parser on synthetic files of each size.
+
+    Parameters:
+        total_items {int} -- board games per size, spread over the files.
+        items_per_file_sizes {list} -- board games per file, 1 to 1200.
+        seed {int} -- seed of the synthetic documents.
+        parser_names {list} -- parsers to measure.
+
+    Returns:
+        {list} -- dictionary of items/sec, parse, frame, and Arrow build seconds, and peak RSS \
+            for each parser and file size.
+    """
+
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix='bgg_parser_benchmark_') as root:
+
+        for items_per_file in items_per_file_sizes:
+
+            paths = []
+            for i, document in enumerate(iter_synthetic_documents(total_items, items_per_file, seed)):
+                paths.append(os.path.join(root, f"{items_per_file}_{i:05d}.xml"))
+                with open(paths[-1], 'wb') as f:
+                    f.write(document)
+
+            for name in parser_names:
+                run = run_probe(probe, json.dumps(parsers[name]), *paths)
+                run.update(parser=name, items_per_file=items_per_file, files=len(paths),
+                           items_per_sec=run["items"] / run["parse_seconds"])
+                results.append(run)
+
+                print(f"{name} x {items_per_file} items/file: {run['items_per_sec']:.0f} items/sec, "
+                      f"frame {run['frame_seconds']:.3f}s, arrow {run['arrow_seconds']:.3f}s, "
+                      f"peak RSS {run['peak_rss_mb']:.0f} MB")
+
+            for path in paths:
+                os.remove(path)
+
+    return results
+
+def compare(results, previous_path):
+    "Prints the change of items/sec of each parser and file size against a previous run."
+
+    with open(previous_path) as f:
+        previous = {(run["parser"], run["items_per_file"]): run for run in json.load(f)["results"]}
+
+    for run in results:
+        before = previous.get((run["parser"], run["items_per_file"]))
+        if before is not None:
+            print(f"{run['parser']} x {run['items_per_file']} items/file: "
+                  f"{run['items_per_sec'] / before['items_per_sec']:.2f}x items/sec, "
+                  f"{run['peak_rss_mb'] - before['peak_rss_mb']:+.0f} MB peak RSS")
+
+def main():
+    "Main function python script."
+
+    parser = argparse.ArgumentParser(description="Benchmark of the BGG XML flatteners on synthetic files.")
+    parser.add_argument('--total-items', type=int, default=12000, help="board games per file size, up to 150000")
+    parser.add_argument('--items-per-file', type=int, nargs='+', default=[1, 100, 1200])
+    parser.add_argument('--parsers', nargs='+', choices=list(parsers), default=list(parsers))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="JSON file of the results, default data/benchmarks/parser_<commit>.json")
+    parser.add_argument('--compare', help="JSON file of a previous run")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    helper_document = next(iter_synthetic_documents(1, 1, args.seed))
+
+    with tempfile.NamedTemporaryFile(suffix='.xml') as f:
+        f.write(helper_document)
+        f.flush()
+        helpers = run_probe(helpers_probe, f.name)
+
+    print(", ".join(f"{name}: {calls:.0f} calls/sec" for name, calls in helpers.items()))
+
+    results = benchmark(args.total_items, args.items_per_file, args.seed, args.parsers)
+
+    output = args.output or os.path.join('data', 'benchmarks', f"parser_{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+
+    with open(output, 'w') as f:
+        json.dump({
+            "commit": commit,
+            "date": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "total_items": args.total_items,
+            "seed": args.seed,
+            "helpers_calls_per_sec": helpers,
+            "results": results,
+        }, f, indent=1)
+
+    print(f"Results saved to {output}.")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import argparse
+
+import numpy as np
+from scipy import sparse
+
+from bgg_recommender import top_k, band_margin, score_block, band_masks, top_k_mask
+
+#recommendation parameters
+block_size = 256 #query games scored per matrix product, bounds the memory of a task
+
+
+def build_model(games, features):
+    """Builds the model of a snapshot in the layout of bgg_recommender.build_model. Only the \
+        IDF-weighted CSR matrix of games x features is built, a few MB for 25k games, and it is \
+        the one matrix broadcast to the executors.
+
+    Parameters:
+        games {list} -- tuples of bgg_id, bgg_rank, and average_weight of the ranked games.
+        features {list} -- tuples of bgg_id, feature, and IDF of each mechanic and category \
+            of the ranked games.
+
+    Returns:
+        {dict} -- bgg_id, bgg_rank, and average_weight arrays of the games, the bounds of their \
+            weight bands, and the weighted feature matrix, rows in the same order as the games.
+    """
+
+    bgg_ids = np.array([game[0] for game in games], dtype=object)
+    rows = {bgg_id: i for i, bgg_id in enumerate(bgg_ids)}
+    columns = {feature: i for i, feature in enumerate(sorted({feature[1] for feature in features}))}
+
+    #features in every game have an IDF of 0, they are stored as explicit zeros of the pattern
+    weighted = sparse.csr_matrix((np.array([feature[2] for feature in features], dtype=np.float64),
+                                  ([rows[feature[0]] for feature in features], [columns[feature[1]] for feature in features])),
+                                 shape=(len(games), len(columns)))
+    average_weight = np.array([np.nan if game[2] is None else game[2] for game in games], dtype=np.float64)
+
+    return {
+        "bgg_id": bgg_ids,
+        "bgg_rank": np.array([game[1] for game in games], dtype=np.float64),
+        "average_weight": average_weight,
+        "lower_weight": np.floor(average_weight),
+        "upper_weight": np.ceil(average_weight),
+        "weighted": weighted,
+    }
+
+def with_binary_matrix(model):
+    "Adds the binary matrix of bgg_recommender, built on the executor from the sparsity pattern of the weighted matrix."
+
+    weighted = model["weighted"]
+    matrix = sparse.csr_matrix((np.ones_like(weighted.data), weighted.indices, weighted.indptr), shape=weighted.shape)
+
+    return dict(model, matrix=matrix)
+
+def recommend_rows(model, queries, k=top_k, margin=band_margin):
+    """Finds the recommendations of a block of games with the scoring, weight band, and top k \
+        selection of bgg_recommender.
+
+    Parameters:
+        model {dict} -- model of build_model with the binary matrix of with_binary_matrix.
+        queries {array} -- row indices of the games to recommend for.
+        k {int} -- number of recommendations per game.
+        margin {float} -- widening of the fallback weight band.
+
+    Returns:
+        {list} -- tuples of bgg_id, position, recommended bgg_id, and score, positions \
+            ordered by rank.
+    """
+
+    scores, shared = score_block(model, queries)
+    selected = top_k_mask(scores, band_masks(model, queries, shared, k, margin), k)
+
+    #the column indices of each row come out in rank order
+    rows, columns = np.nonzero(selected)
+    positions = np.arange(len(rows)) - np.searchsorted(rows, rows) + 1
+
+    return [(model["bgg_id"][queries[row]], int(position), model["bgg_id"][column], float(scores[row, column]))
+            for row, column, position in zip(rows, columns, positions)]
+
+def recommend_games(spark, ranked, classification, snapshots=None, k=top_k, margin=band_margin, num_slices=None):
+    """Computes the recommendations of every ranked game of the given snapshot dates. The IDF \
+        of the mechanics and categories is aggregated in Spark, the model is broadcast, and the \
+        games are scored in blocks across the executors, so no game x game pairs are shuffled. \
+        The recommendations of each snapshot are checkpointed and its broadcast is destroyed \
+        before the next one, so a single model is held at a time.
+
+    Parameters:
+        spark {SparkSession} -- Spark session of the job.
+        ranked {DataFrame} -- date, bgg_id, bgg_rank, and average_weight of the ranked games. \
+            Each date has to be a full snapshot, as it gives the N of the IDF, so the delta \
+            partitions of bgg_api are left out by the caller.
+        classification {DataFrame} -- date, bgg_id, classification, and value of the mechanics \
+            and categories.
+        snapshots {list} -- dates to compute, the latest date of ranked if not given, so the \
+            past snapshots of the history are not recomputed on every run.
+        k {int} -- number of recommendations per game.
+        margin {float} -- widening of the fallback weight band.
+        num_slices {int} -- Spark partitions of the query games, the default parallelism if \
+            not given.
+
+    Returns:
+        {DataFrame} -- bgg_id, position, recom_bgg_id, score, is_top3, and date.
+    """
+
+    from pyspark.sql import functions as F
+    from pyspark.sql.types import StructType, StructField, StringType, IntegerType, DoubleType
+
+    ranked = ranked.select("date", F.col("bgg_id").cast("string").alias("bgg_id"),
+                           F.col("bgg_rank").cast("int").alias("bgg_rank"),
+                           F.col("average_weight").cast("double").alias("average_weight"))
+
+    if snapshots is None:
+        snapshots = [ranked.agg(F.max("date")).first()[0]]
+    ranked = ranked.filter(F.col("date").isin(list(snapshots)))
+
+    #the same name can be a mechanic and a category, so the feature keeps both
+    features = (classification
+                .select("date", F.col("bgg_id").cast("string").alias("bgg_id"),
+                        F.concat_ws(":", "classification", "value").alias("feature"))
+                .join(ranked.select("date", "bgg_id"), on=["date", "bgg_id"], how="inner")
+                .distinct())
+
+    #IDF = log(N / df), N being the number of ranked games of the snapshot
+    n_games = ranked.groupBy("date").agg(F.count("*").alias("n_games"))
+    idf = (features.groupBy("date", "feature").agg(F.count("*").alias("df"))
+           .join(n_games, on="date")
+           .withColumn("idf", F.log(F.col("n_games") / F.col("df"))))
+    weighted_features = features.join(idf.select("date", "feature", "idf"), on=["date", "feature"])
+
+    schema = StructType([
+        StructField("bgg_id", StringType()),
+        StructField("position", IntegerType()),
+        StructField("recom_bgg_id", StringType()),
+        StructField("score", DoubleType()),
+    ])
+    num_slices = num_slices or spark.sparkContext.defaultParallelism
+    snapshot_recommendations = []
+
+    for snapshot in sorted(snapshots):
+
+        games = ranked.filter(F.col("date") == snapshot).orderBy("bgg_rank", "bgg_id").collect()
+        game_features = weighted_features.filter(F.col("date") == snapshot).collect()
+        model = spark.sparkContext.broadcast(build_model(
+            [(game["bgg_id"], game["bgg_rank"], game["average_weight"]) for game in games],
+            [(feature["bgg_id"], feature["feature"], feature["idf"]) for feature in game_features]))
+
+        def score_partition(blocks, model=model):
+            block_model = with_binary_matrix(model.value)
+            for block in blocks:
+                yield from recommend_rows(block_model, np.arange(*block), k, margin)
+
+        blocks = [(start, min(start + block_size, len(games))) for start in range(0, len(games), block_size)]
+        recommendations = spark.createDataFrame(
+            spark.sparkContext.parallelize(blocks, max(1, min(num_slices, len(blocks)))).mapPartitions(score_partition),
+            schema).withColumn("date", F.lit(snapshot))
+
+        #the checkpoint cuts the lineage to the broadcast, which can then be freed
+        snapshot_recommendations.append(recommendations.localCheckpoint(eager=True))
+        model.destroy()
+        print(f"Recommendations of {len(games)} games for {snapshot}.")
+
+    recommendations = snapshot_recommendations[0]
+    for other_recommendations in snapshot_recommendations[1:]:
+        recommendations = recommendations.unionByName(other_recommendations)
+
+    return recommendations.withColumn("is_top3", F.col("position") <= 3).select(
+        "bgg_id", "position", "recom_bgg_id", "score", "is_top3", "date")
+
+def main():
+    "Main function python script."
+
+    parser = argparse.ArgumentParser(description="Computes the recommendations of the ranked games with local-mode Spark.")
+    parser.add_argument('--ranked', default='data/analytics/bgg_ranked.csv', help="CSV of bgg_analytics")
+    parser.add_argument('--classification', nargs='+',
+                        default=['data/analytics/bgg_mechanics.csv', 'data/analytics/bgg_categories.csv'],
+                        help="CSVs of bgg_analytics_classification")
+    parser.add_argument('--output', default='data/analytics/bgg_recommendations_spark')
+    parser.add_argument('--master', default='local[*]')
+    args = parser.parse_args()
+
+    from pyspark.sql import SparkSession
+
+    spark = SparkSession.builder.master(args.master).appName("bgg_recommendations").getOrCreate()
+
+    ranked = spark.read.csv(args.ranked, header=True, inferSchema=True).filter("bgg_rank > 0")
+    classification = spark.read.csv(args.classification, header=True, inferSchema=True)
+
+    recommendations = recommend_games(spark, ranked, classification)
+    recommendations.write.mode("overwrite").partitionBy("date").parquet(args.output)
+
+    print(f"Recommendations saved to {args.output}.")
+    spark.stop()
+
+if __name__ == "__main__":
+    main()
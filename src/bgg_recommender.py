@@ -0,0 +1,389 @@
+import os
+import time
+import random
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+#recommender parameters
+top_k = 10
+band_margin = 0.25 #widening of the weight band when fewer than top_k games are in it
+block_size = 1024 #query games scored per sparse product, bounds the dense score block
+verify_sample = 200 #games checked against bgg_recommend_single, about a second each
+
+
+def load_analytics(analytics_dir='data/analytics'):
+    """Loads the exports of bgg_analytics and bgg_analytics_classification, prepared like in \
+        the recommender notebook.
+
+    Parameters:
+        analytics_dir {string} -- directory of bgg_ranked.csv, bgg_mechanics.csv, and \
+            bgg_categories.csv.
+
+    Returns:
+        {tuple} -- ranked games indexed by bgg_id and sorted by rank, mechanics, and categories.
+    """
+
+    bgg_ranked = pd.read_csv(os.path.join(analytics_dir, 'bgg_ranked.csv'), dtype={'bgg_id': str})
+    bgg_ranked = bgg_ranked.drop(['date', 'type'], axis=1).sort_values('bgg_rank').set_index('bgg_id')
+
+    classifications = []
+    for file_name, column in [('bgg_mechanics.csv', 'mechanic'), ('bgg_categories.csv', 'category')]:
+        df = pd.read_csv(os.path.join(analytics_dir, file_name), dtype={'bgg_id': str})
+        classifications.append(df.drop(['date', 'type', 'classification'], axis=1)
+                               .sort_values('bgg_id').rename({'value': column}, axis=1))
+
+    return bgg_ranked, *classifications
+
+def build_model(bgg_ranked, bgg_mechanics, bgg_categories):
+    """Builds the sparse game x feature matrix of the mechanics and categories and their IDF \
+        once for all the recommendations.
+
+    Parameters:
+        bgg_ranked {dataframe} -- games to recommend, indexed by bgg_id, with bgg_rank and \
+            average_weight.
+        bgg_mechanics {dataframe} -- bgg_id and mechanic of each mechanic of a game.
+        bgg_categories {dataframe} -- bgg_id and category of each category of a game.
+
+    Returns:
+        {dict} -- bgg_id, bgg_rank, and average_weight arrays of the games sorted by rank, \
+            the bounds of their weight bands, the names and IDF of the features, and the binary \
+            and IDF-weighted CSR matrices of games x features.
+    """
+
+    bgg_ranked = bgg_ranked.sort_values('bgg_rank', kind='stable')
+    n_games = len(bgg_ranked)
+
+    #mechanics and categories are kept apart in case a name is used by both
+    features = pd.concat([
+        pd.DataFrame({'bgg_id': bgg_mechanics['bgg_id'].values, 'feature': 'mechanic:' + bgg_mechanics['mechanic']}),
+        pd.DataFrame({'bgg_id': bgg_categories['bgg_id'].values, 'feature': 'category:' + bgg_categories['category']}),
+    ], ignore_index=True)
+
+    #IDF = log(N / df) over all the rows, N being the number of ranked games
+    counts = features['feature'].value_counts().sort_index()
+    idf = np.log(n_games / counts.values)
+
+    rows = pd.Index(bgg_ranked.index).get_indexer(features['bgg_id'])
+    columns = counts.index.get_indexer(features['feature'])
+    in_ranked = rows >= 0
+    matrix = sparse.csr_matrix((np.ones(in_ranked.sum()), (rows[in_ranked], columns[in_ranked])),
+                               shape=(n_games, len(counts)))
+    matrix.data[:] = 1 #duplicated rows count once
+
+    average_weight = bgg_ranked['average_weight'].to_numpy(dtype=np.float64)
+
+    return {
+        "bgg_id": bgg_ranked.index.to_numpy(),
+        "bgg_rank": bgg_ranked['bgg_rank'].to_numpy(dtype=np.float64),
+        "average_weight": average_weight,
+        "lower_weight": np.floor(average_weight),
+        "upper_weight": np.ceil(average_weight),
+        "features": counts.index.to_numpy(),
+        "idf": idf,
+        "matrix": matrix,
+        "weighted": sparse.csr_matrix(matrix.multiply(idf)),
+    }
+
+def score_block(model, queries):
+    """Scores a block of games against all the games with one sparse product.
+
+    Parameters:
+        model {dict} -- arrays of build_model.
+        queries {array} -- row indices of the games to recommend for.
+
+    Returns:
+        {tuple} -- dense arrays of the summed IDF of the shared features and of whether any \
+            feature is shared, one row per query game and one column per game.
+    """
+
+    query_matrix = model["matrix"][queries]
+    scores = (query_matrix @ model["weighted"].T).toarray()
+    shared = (query_matrix @ model["matrix"].T).toarray() > 0
+    shared[np.arange(len(queries)), queries] = False #a game is not recommended for itself
+
+    return scores, shared
+
+def band_masks(model, queries, shared, k=top_k, margin=band_margin):
+    """Applies the weight band rule to a block: the candidates whose weight is between the \
+        floor and ceil of the weight of the query game, or between the bounds widened by \
+        margin when fewer than k candidates are in the band.
+
+    Parameters:
+        model {dict} -- arrays of build_model.
+        queries {array} -- row indices of the query games.
+        shared {array} -- candidates of score_block.
+        k {int} -- number of recommendations per game.
+        margin {float} -- widening of the fallback weight band.
+
+    Returns:
+        {array} -- candidates of each query game within its band.
+    """
+
+    weights = model["average_weight"][None, :]
+    lower, upper = model["lower_weight"][queries, None], model["upper_weight"][queries, None]
+
+    in_band = shared & (weights >= lower) & (weights <= upper)
+    in_fallback = shared & (weights >= lower - margin) & (weights <= upper + margin)
+    use_fallback = in_band.sum(axis=1, keepdims=True) < k
+
+    return np.where(use_fallback, in_fallback, in_band)
+
+def top_k_mask(scores, candidates, k=top_k):
+    """Selects the k candidates with the highest scores of each row without sorting the rows. \
+        The columns are ordered by rank, so the candidates tied with the k-th score are taken \
+        from the left, i.e. ties are broken by the better rank.
+
+    Parameters:
+        scores {array} -- scores of a block, one row per query game.
+        candidates {array} -- candidates of each query game.
+        k {int} -- number of selected candidates per row.
+
+    Returns:
+        {array} -- selected candidates, at most k per row.
+    """
+
+    masked = np.where(candidates, scores, -np.inf)
+    kth = min(k, masked.shape[1]) - 1
+    threshold = -np.partition(-masked, kth, axis=1)[:, kth, None]
+
+    above = masked > threshold
+    tied = candidates & (masked == threshold)
+    needed = k - above.sum(axis=1, keepdims=True)
+
+    return above | (tied & (np.cumsum(tied, axis=1) <= needed))
+
+def recommend_block(model, queries, k=top_k, margin=band_margin):
+    """Finds the top k games of a block of query games by score within their weight band.
+
+    Parameters:
+        model {dict} -- arrays of build_model.
+        queries {array} -- row indices of the query games.
+        k {int} -- number of recommendations per game.
+        margin {float} -- widening of the fallback weight band.
+
+    Returns:
+        {list} -- row indices of the recommended games of each query game, ordered by rank.
+    """
+
+    scores, shared = score_block(model, queries)
+    selected = top_k_mask(scores, band_masks(model, queries, shared, k, margin), k)
+
+    #the column indices of each row come out in rank order
+    rows, columns = np.nonzero(selected)
+
+    return np.split(columns, np.cumsum(np.bincount(rows, minlength=len(queries)))[:-1])
+
+def recommend_all(model, k=top_k, margin=band_margin, block_size=block_size):
+    """Computes the recommendations of every game of the model, block by block.
+
+    Parameters:
+        model {dict} -- arrays of build_model.
+        k {int} -- number of recommendations per game.
+        margin {float} -- widening of the fallback weight band.
+        block_size {int} -- query games per sparse product.
+
+    Returns:
+        {dataframe} -- bgg_id, position, and recom_bgg_id of each recommendation, positions \
+            ordered by rank like bgg_recommend_single.
+    """
+
+    bgg_ids, positions, recommended = [], [], []
+
+    for start in range(0, len(model["bgg_id"]), block_size):
+        queries = np.arange(start, min(start + block_size, len(model["bgg_id"])))
+        for query, selected in zip(queries, recommend_block(model, queries, k, margin)):
+            bgg_ids += [model["bgg_id"][query]] * len(selected)
+            positions += range(1, len(selected) + 1)
+            recommended += list(model["bgg_id"][selected])
+
+    return pd.DataFrame({'bgg_id': bgg_ids, 'position': positions, 'recom_bgg_id': recommended})
+
+def recommend_single(model, game, k=top_k, margin=band_margin):
+    "Returns the BGG IDs of the recommendations of a single game, ordered by rank."
+
+    query = np.flatnonzero(model["bgg_id"] == game)
+
+    return pd.Series(model["bgg_id"][recommend_block(model, query, k, margin)[0]])
+
+def classification_vectors(bgg_mechanics, bgg_categories):
+    "Returns the binary pivot tables of the mechanics and categories used by bgg_recommend_single."
+
+    vectors = []
+    for df, column in [(bgg_mechanics, 'mechanic'), (bgg_categories, 'category')]:
+        vector = df.pivot_table(index='bgg_id', columns=column, aggfunc='count', fill_value=0)
+        vector.columns = vector.columns.droplevel(0)
+        vector.columns.name = None
+        vectors.append(vector)
+
+    return vectors
+
+def bgg_recommend_single(df, game, bgg_mechanics, bgg_categories, bgg_mechanics_vector, bgg_categories_vector):
+    """Recommends board games based on similarity scores calculated using Inverse-Document Frequency within\
+    the same weight scale and ranked by geek rating. Reference implementation of the recommender notebook, \
+    kept to check recommend_block.
+
+    Parameters:
+        df {dataframe} -- contains the collection of board games where similar games will be identified.
+        game {string} -- BGG ID of the board game of interest.
+        bgg_mechanics {dataframe} -- bgg_id and mechanic of each mechanic of a game.
+        bgg_categories {dataframe} -- bgg_id and category of each category of a game.
+        bgg_mechanics_vector {dataframe} -- binary mechanics of each game, from classification_vectors.
+        bgg_categories_vector {dataframe} -- binary categories of each game, from classification_vectors.
+
+    Returns:
+        {dataframe} -- top 10 recommendations by IDF values, complexity scale, and geek rating.
+    """
+
+    #Calculate IDF values of mechanics and categories
+    n_games = len(df)
+
+    n_mechanics = bgg_mechanics.value_counts('mechanic').reset_index(name='count')
+    n_mechanics['idf'] = np.log(n_games/n_mechanics['count'])
+    n_mechanics = n_mechanics.sort_values('mechanic').reset_index(drop=True)
+
+    n_categories = bgg_categories.value_counts('category').reset_index(name='count')
+    n_categories['idf'] = np.log(n_games/n_categories['count'])
+    n_categories = n_categories.sort_values('category').reset_index(drop=True)
+
+    #Filter Mechanics and Categories of df
+    df_mechanics_vector = bgg_mechanics_vector[bgg_mechanics_vector.index.isin(df.index)]
+    df_categories_vector = bgg_categories_vector[bgg_categories_vector.index.isin(df.index)]
+
+    #AND Operation
+    if game in df_mechanics_vector.index:
+        #obtain mechanics of selected game
+        game_mechanics_vector = bgg_mechanics_vector.loc[game]
+        game_mechanics = game_mechanics_vector[game_mechanics_vector.values == 1].index.to_list()
+
+        #isolate columns based on mechanics of selected game
+        df_game_mechanics_vector = df_mechanics_vector[game_mechanics]
+
+        #determine games that has at least one similar mechanic with the selected game
+        similar_games_mechanics = df_game_mechanics_vector[(df_game_mechanics_vector & game_mechanics_vector).any(axis=1)]\
+        .drop(index=game)
+
+        #Compute for similarity score of similar games
+        game_n_mechanics = n_mechanics[n_mechanics['mechanic'].isin(game_mechanics)]['idf']
+        mechanics_idf = pd.DataFrame(index = similar_games_mechanics.index,
+                     data = {'idf':np.dot(similar_games_mechanics, game_n_mechanics)}
+                    )
+    else:
+        mechanics_idf = pd.DataFrame()
+
+    if game in df_categories_vector.index:
+        game_categories_vector = bgg_categories_vector.loc[game]
+        game_categories = game_categories_vector[game_categories_vector.values == 1].index.to_list()
+
+        df_game_categories_vector = df_categories_vector[game_categories]
+
+        similar_games_categories = df_game_categories_vector[(df_game_categories_vector & game_categories_vector).any(axis=1)]\
+        .drop(index=game)
+
+        game_n_categories = n_categories[n_categories['category'].isin(game_categories)]['idf']
+        categories_idf = pd.DataFrame(index = similar_games_categories.index,
+                     data = {'idf':np.dot(similar_games_categories, game_n_categories)}
+                    )
+    else:
+        categories_idf = 0
+
+    similar_games = mechanics_idf.add(categories_idf, fill_value=0).sort_values('idf', ascending=False)
+    similar_games_df = df.loc[similar_games.index.to_list()]
+
+    #Compute for lower and upper boundary weight of selected game
+    lower_weight_bound = np.floor(df.loc[game]['average_weight'])
+    upper_weight_bound = np.ceil(df.loc[game]['average_weight'])
+
+    #Recommend games that are within the same weight class
+    recommended_games = similar_games_df[similar_games_df['average_weight']\
+                                         .between(lower_weight_bound, upper_weight_bound)][:10]
+    if len(recommended_games) < 10:
+        recommended_games = similar_games_df[similar_games_df['average_weight']\
+                                         .between(lower_weight_bound-0.25, upper_weight_bound+0.25)][:10]
+
+    return pd.Series(recommended_games.sort_values('bgg_rank').index)
+
+def verify(model, recommendations, bgg_ranked, bgg_mechanics, bgg_categories, sample=verify_sample, seed=0, games=None):
+    """Compares the recommendations with bgg_recommend_single on a sample of games. The notebook \
+        sorts the scores with an unstable sort, so games tied with the 10th score may be picked \
+        differently; such rows count as equivalent when the scores of both selections are equal.
+
+    Parameters:
+        model {dict} -- arrays of build_model.
+        recommendations {dataframe} -- output of recommend_all.
+        bgg_ranked {dataframe} -- ranked games of load_analytics.
+        bgg_mechanics {dataframe} -- mechanics of load_analytics.
+        bgg_categories {dataframe} -- categories of load_analytics.
+        sample {int} -- number of games checked, all the games if 0.
+        seed {int} -- seed of the sample.
+        games {list} -- BGG IDs checked instead of a sample.
+
+    Returns:
+        {dict} -- number of identical, tied, and different games, and the different BGG IDs.
+    """
+
+    vectors = classification_vectors(bgg_mechanics, bgg_categories)
+    rows = {bgg_id: i for i, bgg_id in enumerate(model["bgg_id"])}
+    recommended = recommendations.groupby('bgg_id')['recom_bgg_id'].apply(list).to_dict()
+    if games is None:
+        games = list(model["bgg_id"])
+        if sample:
+            games = random.Random(seed).sample(games, min(sample, len(games)))
+
+    def selection_scores(game, bgg_ids):
+        query = model["matrix"][rows[game]]
+        return sorted(np.round((query @ model["weighted"][[rows[bgg_id] for bgg_id in bgg_ids]].T).toarray().ravel(), 9))
+
+    results = {"identical": 0, "tied": 0, "different": []}
+
+    for game in games:
+        try:
+            expected = bgg_recommend_single(bgg_ranked, game, bgg_mechanics, bgg_categories, *vectors).to_list()
+        except KeyError:
+            expected = [] #games without mechanics and categories have no recommendations
+        found = recommended.get(game, [])
+
+        if found == expected:
+            results["identical"] += 1
+        elif selection_scores(game, found) == selection_scores(game, expected):
+            results["tied"] += 1
+        else:
+            results["different"].append(game)
+
+    return results
+
+def main():
+    "Main function python script."
+
+    parser = argparse.ArgumentParser(description="Computes the recommendations of all the ranked games.")
+    parser.add_argument('--analytics-dir', default='data/analytics')
+    parser.add_argument('--output', default='data/analytics/bgg_recommendations_idf.csv')
+    parser.add_argument('--block-size', type=int, default=block_size)
+    parser.add_argument('--verify', action='store_true', help="compares the results with bgg_recommend_single")
+    parser.add_argument('--verify-sample', type=int, default=verify_sample, help="games compared, 0 for all")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    analytics = load_analytics(args.analytics_dir)
+    model = build_model(*analytics)
+    built = time.perf_counter()
+    recommendations = recommend_all(model, block_size=args.block_size)
+    done = time.perf_counter()
+
+    print(f"Model of {model['matrix'].shape[0]} games x {model['matrix'].shape[1]} features built in {built - start:.2f}s, "
+          f"{len(recommendations)} recommendations in {done - built:.2f}s.")
+
+    recommendations.to_csv(args.output, index=False)
+    print(f"Recommendations saved to {args.output}.")
+
+    if args.verify:
+        results = verify(model, recommendations, *analytics, sample=args.verify_sample)
+        print(f"Verified against bgg_recommend_single: {results['identical']} identical, "
+              f"{results['tied']} equal up to ties, {len(results['different'])} different {results['different']}.")
+        if results["different"]:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+import os
+import json
+import gzip
+import zlib
+import shutil
+import hashlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+compression_suffixes = {
+    None: "",
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+#raw files of a delta run of bgg_api only hold the new and changed games, not a full snapshot
+delta_file_prefix = "delta-"
+
+
+class CompressingReader:
+    """Read-only file object that compresses an iterator of bytes on the fly so an HTTP body \
+        can be streamed into a multipart upload without being buffered in memory.
+
+    Parameters:
+        chunks {iterator} -- yields the uncompressed bytes, such as Response.iter_content().
+        compression {string} -- 'gzip', 'zstd', or None to pass the bytes through.
+    """
+
+    def __init__(self, chunks, compression=None):
+        self.chunks = iter(chunks)
+        self.buffer = bytearray()
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.sha256 = hashlib.sha256()
+        self.exhausted = False
+
+        if compression == "gzip":
+            self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) #gzip container
+        elif compression == "zstd":
+            if zstandard is None:
+                raise ValueError("zstd compression requires the zstandard package.")
+            self.compressor = zstandard.ZstdCompressor().compressobj()
+        elif compression is None:
+            self.compressor = None
+        else:
+            raise ValueError(f"Unsupported compression: {compression}.")
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        "Returns up to size compressed bytes, reading from the source only as much as needed."
+
+        while not self.exhausted and (size < 0 or len(self.buffer) < size):
+            chunk = next(self.chunks, None)
+
+            if chunk is None:
+                self.exhausted = True
+                if self.compressor is not None:
+                    self.buffer += self.compressor.flush()
+                break
+
+            self.raw_bytes += len(chunk)
+            self.buffer += self.compressor.compress(chunk) if self.compressor is not None else chunk
+
+        if size < 0:
+            size = len(self.buffer)
+
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+
+        self.stored_bytes += len(data)
+        self.sha256.update(data)
+
+        return data
+
+
+def open_object_stream(body, key):
+    """Wraps an S3 object body with a decompressor chosen from the suffix of the object key.
+
+    Parameters:
+        body {file object} -- binary body of the S3 object, such as a boto3 StreamingBody.
+        key {string} -- key of the S3 object ending in .xml, .xml.gz, or .xml.zst.
+
+    Returns:
+        {file object} -- binary file object that yields the uncompressed content.
+    """
+
+    if key.endswith(".gz"):
+        return gzip.GzipFile(fileobj=body, mode='rb')
+
+    if key.endswith(".zst"):
+        if zstandard is None:
+            raise ValueError("zstd compressed objects require the zstandard package.")
+        return zstandard.ZstdDecompressor().stream_reader(body)
+
+    return body
+
+
+class LocalS3Client:
+    """File-backed stand-in for the boto3 S3 client that stores objects under a local directory \
+        so the pipeline can be run and tested offline.
+
+    Parameters:
+        root {string} -- local directory where each bucket is stored as a subdirectory.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def object_path(self, bucket, key):
+        "Returns the local file path of an object."
+
+        return os.path.join(self.root, bucket, *key.split('/'))
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, **kwargs):
+        "Copies a binary file-like object into the local bucket directory."
+
+        path = self.object_path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(Fileobj, f)
+
+    def put_object(self, Body, Bucket, Key, **kwargs):
+        "Writes bytes into the local bucket directory."
+
+        path = self.object_path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'wb') as f:
+            f.write(Body)
+
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        "Opens a stored object, the body is a binary file object like the boto3 StreamingBody."
+
+        path = self.object_path(Bucket, Key)
+        return {'Body': open(path, 'rb'), 'ContentLength': os.path.getsize(path)}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        "Removes a stored object, missing objects are ignored like in S3."
+
+        path = self.object_path(Bucket, Key)
+        if os.path.exists(path):
+            os.remove(path)
+
+        return {}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        "Returns the size of a stored object."
+
+        return {'ContentLength': os.path.getsize(self.object_path(Bucket, Key))}
+
+
+#pyarrow type of each Glue column type, used to keep the files and the catalog aligned
+catalog_types = {
+    "int": "int32",
+    "bigint": "int64",
+    "float": "float32",
+    "double": "float64",
+    "string": "string",
+}
+
+#clients and the backend are created on first use and reused by warm invocations
+static_vars = {
+    "clients": {},
+    "backend": None,
+}
+
+
+def get_client(service):
+    "Returns the boto3 client of a service, created on first use so importing a module does not pay for boto3."
+
+    clients = static_vars["clients"]
+
+    if service not in clients:
+        import boto3
+        clients[service] = boto3.client(service)
+
+    return clients[service]
+
+
+class GlueCatalog:
+    "Catalog backend of the tables and partitions registered in the AWS Glue Data Catalog."
+
+    def __init__(self):
+        self.tables = {}
+
+    def get_table(self, database, table):
+        "Returns the Glue table definition, None if the table does not exist yet."
+
+        if (database, table) not in self.tables:
+            glue = get_client('glue')
+            try:
+                self.tables[(database, table)] = glue.get_table(DatabaseName=database, Name=table)['Table']
+            except glue.exceptions.EntityNotFoundException:
+                return None
+
+        return self.tables[(database, table)]
+
+    def create_partitions(self, database, table, partitions_values):
+        """Registers new partitions with the storage descriptor of the table, partitions that \
+            already exist are left as they are.
+
+        Parameters:
+            database {string} -- Glue database of the table.
+            table {string} -- Glue table.
+            partitions_values {dict} -- values of each partition, keyed by its location.
+        """
+
+        storage_descriptor = self.get_table(database, table)['StorageDescriptor']
+        response = get_client('glue').batch_create_partition(
+            DatabaseName=database,
+            TableName=table,
+            PartitionInputList=[{
+                "Values": values,
+                "StorageDescriptor": {**storage_descriptor, "Location": location},
+            } for location, values in partitions_values.items()])
+
+        #partitions written by an earlier batch of the same day are already registered
+        for error in response.get('Errors', []):
+            if error['ErrorDetail']['ErrorCode'] != 'AlreadyExistsException':
+                raise RuntimeError(f"Partition {error['PartitionValues']} was not registered: "
+                                   f"{error['ErrorDetail']['ErrorMessage']}")
+
+    def get_partitions(self, database, table):
+        "Lists the location of each partition of the table, keyed by its values."
+
+        paginator = get_client('glue').get_paginator('get_partitions')
+        found = {}
+
+        for page in paginator.paginate(DatabaseName=database, TableName=table):
+            for partition in page['Partitions']:
+                found[tuple(partition['Values'])] = partition['StorageDescriptor']['Location']
+
+        return found
+
+    def update_partition_location(self, database, table, values, location):
+        "Points a partition to a new location in a single update, so readers switch at once."
+
+        glue = get_client('glue')
+        partition = glue.get_partition(DatabaseName=database, TableName=table,
+                                       PartitionValues=list(values))['Partition']
+
+        glue.update_partition(DatabaseName=database,
+                              TableName=table,
+                              PartitionValueList=list(values),
+                              PartitionInput={
+                                  "Values": list(values),
+                                  "StorageDescriptor": {**partition['StorageDescriptor'], "Location": location},
+                                  "Parameters": partition.get('Parameters', {}),
+                              })
+
+
+class LocalCatalog:
+    """File-backed stand-in for the Glue Data Catalog that keeps each table definition and its \
+        partitions in a JSON file, {root}/_catalog/<database>/<table>.json.
+
+    Parameters:
+        root {string} -- local directory of the backend.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def table_path(self, database, table):
+        "Returns the JSON file of a table."
+
+        return os.path.join(self.root, '_catalog', database, f"{table}.json")
+
+    def save_table(self, database, table, definition):
+        "Writes the definition of a table, replacing the file only once it is complete."
+
+        path = self.table_path(database, table)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path + '.tmp', 'w') as f:
+            json.dump(definition, f, indent=1)
+        os.replace(path + '.tmp', path)
+
+    def get_table(self, database, table):
+        "Returns the table definition in the shape of the Glue API, None if it does not exist."
+
+        path = self.table_path(database, table)
+        if not os.path.exists(path):
+            return None
+
+        with open(path) as f:
+            return json.load(f)
+
+    def create_table(self, database, table, columns, partition_keys, location):
+        """Registers a table.
+
+        Parameters:
+            database {string} -- database of the table.
+            table {string} -- name of the table.
+            columns {dict} -- Glue type of each column, in order.
+            partition_keys {list} -- names of the partition columns, of type string.
+            location {string} -- path of the dataset.
+        """
+
+        self.save_table(database, table, {
+            "Name": table,
+            "StorageDescriptor": {
+                "Columns": [{"Name": name, "Type": column_type} for name, column_type in columns.items()],
+                "Location": location,
+            },
+            "PartitionKeys": [{"Name": name, "Type": "string"} for name in partition_keys],
+            "Partitions": [],
+        })
+
+    def create_partitions(self, database, table, partitions_values):
+        "Registers new partitions, keyed by their location; partitions that already exist are kept."
+
+        definition = self.get_table(database, table)
+        registered = {tuple(partition['Values']) for partition in definition['Partitions']}
+
+        for location, values in partitions_values.items():
+            if tuple(values) not in registered:
+                definition['Partitions'].append({"Values": list(values), "Location": location})
+
+        self.save_table(database, table, definition)
+
+    def get_partitions(self, database, table):
+        "Lists the location of each partition of the table, keyed by its values."
+
+        return {tuple(partition['Values']): partition['Location']
+                for partition in self.get_table(database, table)['Partitions']}
+
+    def update_partition_location(self, database, table, values, location):
+        "Points a partition to a new location."
+
+        definition = self.get_table(database, table)
+
+        for partition in definition['Partitions']:
+            if partition['Values'] == list(values):
+                partition['Location'] = location
+
+        self.save_table(database, table, definition)
+
+
+class StorageBackend:
+    """Objects and catalog used by the transform layer: S3 and Glue, or a local directory that \
+        stores s3://bucket/key as <root>/bucket/key and a LocalCatalog.
+
+    Parameters:
+        name {string} -- 's3' or 'local'.
+        root {string} -- local directory of the local backend.
+    """
+
+    def __init__(self, name, root=None):
+        if name not in ("s3", "local"):
+            raise ValueError(f"Unsupported storage backend: {name}.")
+
+        self.name = name
+        self.root = root
+        self.catalog = LocalCatalog(root) if name == "local" else GlueCatalog()
+        self.client = LocalS3Client(root) if name == "local" else None
+
+    @property
+    def s3(self):
+        "S3 client of the backend, the boto3 client is created on first use."
+
+        return self.client or get_client('s3')
+
+    def local_path(self, uri):
+        "Returns the local path of an s3:// URI for the local backend, and other paths as they are."
+
+        if self.name == "local" and uri.startswith('s3://'):
+            bucket, _, key = uri[len('s3://'):].partition('/')
+            return self.client.object_path(bucket, key.rstrip('/'))
+
+        return uri
+
+
+def get_backend():
+    """Returns the storage backend selected by BGG_STORAGE_BACKEND ('s3' or 'local'). The \
+        configuration is read on first use; S3_LOCAL_ROOT sets the directory of the local \
+        backend, which is also the default backend when it is set.
+
+    Returns:
+        {StorageBackend} -- backend shared by the module.
+    """
+
+    if static_vars["backend"] is None:
+        local_root = os.getenv("S3_LOCAL_ROOT")
+        name = os.getenv("BGG_STORAGE_BACKEND", "local" if local_root else "s3")
+        static_vars["backend"] = StorageBackend(name, local_root or "data/local_s3")
+
+    return static_vars["backend"]
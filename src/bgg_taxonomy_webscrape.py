@@ -0,0 +1,146 @@
+import os
+import json
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from bgg_http import TokenBucket, CachedSession, RetryPolicy, send_with_retries
+from bgg_html import parse_link_table, parse_meta_description
+
+#taxonomy crawler parameters
+taxonomy_ttl_days = int(os.getenv("BGG_TAXONOMY_TTL_DAYS", "30"))
+taxonomy_workers = int(os.getenv("BGG_TAXONOMY_WORKERS", "4"))
+taxonomy_requests_per_sec = float(os.getenv("BGG_TAXONOMY_REQUESTS_PER_SEC", "1"))
+
+static_vars = {
+    "fetched_path": 'data/analytics/taxonomy_fetched.json',
+    "mechanic": {
+        "url": r'https://boardgamegeek.com/browse/boardgamemechanic',
+        "output_path": 'data/analytics/mechanics description.json',
+    },
+    "category": {
+        "url": r'https://boardgamegeek.com/browse/boardgamecategory',
+        "output_path": 'data/analytics/categories description.json',
+    },
+}
+
+
+def load_descriptions(output_path, taxonomy):
+    """Loads the descriptions stored by a previous crawl.
+
+    Parameters:
+        output_path {string} -- JSON lines file of the taxonomy descriptions.
+        taxonomy {string} -- 'mechanic' or 'category', the name of the key column.
+
+    Returns:
+        {dict} -- description of each taxonomy entry, empty if the file does not exist.
+    """
+
+    if not os.path.exists(output_path):
+        return {}
+
+    descriptions = pd.read_json(output_path, orient='records', lines=True)
+    return dict(zip(descriptions[taxonomy], descriptions['description']))
+
+def load_fetched_times(fetched_path):
+    "Loads the time each taxonomy entry was last fetched."
+
+    if not os.path.exists(fetched_path):
+        return {}
+
+    with open(fetched_path) as f:
+        return json.load(f)
+
+def select_stale(links, descriptions, fetched_times, default_time, ttl):
+    """Selects the taxonomy entries that are new or whose description is older than the TTL.
+
+    Parameters:
+        links {dict} -- link of each entry in the taxonomy index.
+        descriptions {dict} -- cached description of each entry.
+        fetched_times {dict} -- ISO time each entry was last fetched.
+        default_time {datetime} -- fetch time assumed for cached entries without one, such \
+            as descriptions stored before fetch times were recorded.
+        ttl {timedelta} -- maximum age of a cached description.
+
+    Returns:
+        {list} -- names of the entries whose description pages have to be fetched.
+    """
+
+    now = datetime.now()
+
+    return [name for name in links
+            if name not in descriptions
+            or now - (datetime.fromisoformat(fetched_times[name]) if name in fetched_times
+                      else default_time) > ttl]
+
+def crawl_taxonomy(taxonomy, session=None, rate_limiter=None, retry_policy=None,
+                   max_workers=taxonomy_workers, ttl=timedelta(days=taxonomy_ttl_days)):
+    """Refreshes the descriptions of the board game mechanics or categories, fetching only the \
+        description pages that are new or older than the TTL.
+
+    Parameters:
+        taxonomy {string} -- 'mechanic' or 'category'.
+        session {CachedSession} -- pooled session, a new one is created if not given.
+        rate_limiter {TokenBucket} -- token bucket shared by all workers.
+        retry_policy {RetryPolicy} -- retry policy shared by all workers.
+        max_workers {int} -- maximum number of description pages requested at the same time.
+        ttl {timedelta} -- maximum age of a cached description.
+
+    Returns:
+        {dataframe} -- name and description of each entry of the taxonomy index.
+    """
+
+    session = session or CachedSession(pool_size=max_workers)
+    rate_limiter = rate_limiter or TokenBucket(rate=taxonomy_requests_per_sec)
+    retry_policy = retry_policy or RetryPolicy()
+
+    output_path = static_vars[taxonomy]["output_path"]
+    descriptions = load_descriptions(output_path, taxonomy)
+    fetched_times = load_fetched_times(static_vars["fetched_path"])
+    taxonomy_times = fetched_times.setdefault(taxonomy, {})
+    default_time = datetime.fromtimestamp(os.path.getmtime(output_path)) \
+        if os.path.exists(output_path) else datetime.min
+
+    def fetch(url):
+        with send_with_retries(url, retry_policy, rate_limiter, session) as response:
+            response.raise_for_status()
+            return response.text
+
+    links = parse_link_table(fetch(static_vars[taxonomy]["url"]), 'forum_table')
+    stale = select_stale(links, descriptions, taxonomy_times, default_time, ttl)
+
+    print(f"{len(stale)}/{len(links)} {taxonomy} descriptions are new or older than {ttl.days} days.")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for name, html in zip(stale, executor.map(fetch, [links[name] for name in stale])):
+            descriptions[name] = parse_meta_description(html)
+            taxonomy_times[name] = datetime.now().isoformat(timespec='seconds')
+
+    #cached entries without a fetch time keep aging from the time of the previous output file
+    fetched_times[taxonomy] = {name: taxonomy_times.get(name, default_time.isoformat(timespec='seconds'))
+                               for name in links}
+
+    taxonomy_description = pd.DataFrame({
+        taxonomy: list(links),
+        'description': [descriptions[name] for name in links],
+    })
+    taxonomy_description.to_json(output_path, orient='records', lines=True)
+
+    with open(static_vars["fetched_path"], 'w') as f:
+        json.dump(fetched_times, f, indent=1, sort_keys=True)
+
+    return taxonomy_description
+
+def main():
+    "Main function python script."
+
+    session = CachedSession(pool_size=taxonomy_workers)
+    rate_limiter = TokenBucket(rate=taxonomy_requests_per_sec)
+    retry_policy = RetryPolicy()
+
+    for taxonomy in ("mechanic", "category"):
+        crawl_taxonomy(taxonomy, session, rate_limiter, retry_policy)
+
+if __name__ == "__main__":
+    main()
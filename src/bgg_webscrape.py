@@ -1,23 +1,42 @@
 import time
 import random
 import os
+import re
+import shutil
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
-from bs4 import BeautifulSoup
 import pandas as pd
 from dotenv import load_dotenv
 
+from bgg_http import TokenBucket, CachedSession, RetryPolicy, send_with_retries
+from bgg_html import parse_listing_page
+
 # load environment variables
 load_dotenv()
 bgg_username = os.getenv("BGG_USERNAME")
 bgg_password =  os.getenv("BGG_PASSWORD")
 
+#http scraping parameters
+scrape_mode = os.getenv("BGG_SCRAPE_MODE", "http") #http or browser
+scrape_workers = int(os.getenv("BGG_SCRAPE_WORKERS", "4"))
+scrape_requests_per_sec = float(os.getenv("BGG_SCRAPE_REQUESTS_PER_SEC", "1"))
+
+#listing output parameters
+listing_parts_dir = os.getenv("BGG_LISTING_PARTS_DIR", "data/listing_parts")
+listing_chunk_pages = int(os.getenv("BGG_LISTING_CHUNK_PAGES", "50"))
+listing_part_format = os.getenv("BGG_LISTING_PART_FORMAT", "csv") #csv or parquet
+listing_columns = ["board_game_rank", "bgg_id", "title", "year", "geek_rating", "avg_rating", "num_voters"]
+
 static_vars = {
     "local_driver_path": r"chromedriver.exe",
     "url": r'https://boardgamegeek.com/browse/boardgame/page/1',
+    "page_url": r'https://boardgamegeek.com/browse/boardgame/page/{}',
     "sign_in_btn":'//*[@id="global-header-outer"]/header/nav/div/div[2]/div/div[1]/ul/li[7]/button',
     "username_box":'//*[@id="inputUsername"]',
     "password_box": '//*[@id="inputPassword"]',
@@ -93,38 +112,101 @@ def scrape_page(driver):
             and rating from BoardGameGeek 'All Boardgames' Web page.
     """
 
-    board_games = []
-    soup = BeautifulSoup(driver.page_source, 'lxml')
-    table = soup.find('table', class_ = 'collection_table')
+    return pd.DataFrame(parse_listing_page(driver.page_source))
 
-    for row in table.find_all('tr')[1:]:
+def find_last_page(html):
+    "Returns the number of the last 'All Boardgames' page from the page links, None if not found."
 
-        row_data = [data.text.strip() for data in row.find_all('td')]
-        year_tag = row.find('span', class_='smallerfont dull')
+    match = re.search(r'href="/browse/boardgame/page/(\d+)"[^>]*title="last page"', html)
+    return int(match.group(1)) if match else None
 
-        try:
-            bgg_rank = row_data[0]
-            bgg_id = row.find('a', class_ = 'primary').get('href').split('/')[2]
-            title = row.find('a', class_ = 'primary').text
-            year = year_tag.text[1:5] if year_tag is not None else "N/A"
-            geek_rating = row_data[4]
-            avg_rating = row_data[5]
-            num_voters = row_data[6]
-
-            board_games.append({
-                "board_game_rank":bgg_rank,
-                "bgg_id":bgg_id,
-                "title":title,
-                "year":year,
-                "geek_rating":geek_rating,
-                "avg_rating":avg_rating,
-                "num_voters":num_voters,
-            })
-
-        except Exception as e:
-            pass
-
-    return pd.DataFrame(board_games)
+def session_from_driver(driver, pool_size):
+    """Creates a pooled HTTP session that reuses the cookies of a logged in Selenium WebDriver.
+
+    Parameters:
+        driver {WebDriver} -- an instance of Selenium WebDriver with BoardGameGeek account \
+            already logged in.
+        pool_size {int} -- maximum number of connections kept alive.
+
+    Returns:
+        {CachedSession} -- session that sends requests as the logged in BoardGameGeek account.
+    """
+
+    session = CachedSession(pool_size=pool_size)
+    session.session.headers['User-Agent'] = driver.execute_script("return navigator.userAgent")
+
+    for cookie in driver.get_cookies():
+        session.session.cookies.set(cookie['name'], cookie['value'],
+                                    domain=cookie.get('domain'), path=cookie.get('path', '/'))
+
+    return session
+
+def fetch_listing_page(page_number, session, rate_limiter, retry_policy):
+    """Downloads and parses a single 'All Boardgames' Web page.
+
+    Parameters:
+        page_number {int} -- number of the 'All Boardgames' page.
+        session {CachedSession} -- logged in session shared by all workers.
+        rate_limiter {TokenBucket} -- token bucket shared by all workers.
+        retry_policy {RetryPolicy} -- retry policy shared by all workers.
+
+    Returns:
+        {list} -- board game features of each row of the page.
+    """
+
+    url = static_vars["page_url"].format(page_number)
+
+    with send_with_retries(url, retry_policy, rate_limiter, session) as response:
+        response.raise_for_status()
+        return parse_listing_page(response.text)
+
+def iter_http_pages(session, max_workers, rate_limiter, retry_policy, first_page=1, last_page=None):
+    """Fetches the 'All Boardgames' pages concurrently through a bounded pool of workers and \
+        yields them in page order. An empty page up to the known last page, such as a login \
+        or captcha page, raises a RuntimeError so a short listing is not taken for the full one.
+
+    Parameters:
+        session {CachedSession} -- logged in session shared by all workers.
+        max_workers {int} -- maximum number of pages requested at the same time.
+        rate_limiter {TokenBucket} -- token bucket shared by all workers.
+        retry_policy {RetryPolicy} -- retry policy shared by all workers.
+        first_page {int} -- number of the first page to fetch.
+        last_page {int} -- number of the last page, pages are fetched until an empty page \
+            is found if not given.
+
+    Returns:
+        {generator} -- yields the page number and the board game features of each page.
+    """
+
+    in_flight = deque()
+    next_page = first_page
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        while True:
+
+            #keep a bounded window of pages ahead of the page being yielded
+            while len(in_flight) < 2 * max_workers and (last_page is None or next_page <= last_page):
+                in_flight.append((next_page, executor.submit(
+                    fetch_listing_page, next_page, session, rate_limiter, retry_policy)))
+                next_page += 1
+
+            if not in_flight:
+                break
+
+            page_number, future = in_flight.popleft()
+            rows = future.result()
+
+            if not rows:
+                for _, pending in in_flight:
+                    pending.cancel()
+
+                if last_page is not None:
+                    raise RuntimeError(f"Page {page_number} has no board games but the listing has "
+                                       f"{last_page} pages. Web scraping stopped.")
+                break
+
+            yield page_number, rows
 
 def initial_load(driver):
     """Loads the first page of BoardGameGeek 'All Boardgames' and performs \
@@ -145,25 +227,25 @@ def initial_load(driver):
 
     return driver
 
-def main():
-    "Main function python script."
+def iter_browser_pages(driver, first_page=1):
+    """Scrapes the 'All Boardgames' pages by clicking the next page button of the browser.
 
-    #selenium options to remove errors
-    options = webdriver.ChromeOptions()
-    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    Parameters:
+        driver {WebDriver} -- an instance of Selenium WebDriver with BoardGameGeek account \
+            already logged in.
+        first_page {int} -- number of the first page to scrape.
 
-    driver = webdriver.Chrome(service = Service(static_vars["local_driver_path"]), options=options)
-    driver = initial_load(driver)
+    Returns:
+        {generator} -- yields the page number and the board game features of each page.
+    """
 
-    df = pd.DataFrame()
+    if first_page != 1:
+        driver.get(static_vars["page_url"].format(first_page))
 
     while True:
 
-        df_tmp = scrape_page(driver)
-        df = pd.concat([df, df_tmp], ignore_index=True)
-
         page_number = driver.current_url.split('/')[-1]
-        print(f'Page {page_number} scraped. {df.shape[0]} board games available.')
+        yield int(page_number), parse_listing_page(driver.page_source)
 
         try:
 
@@ -181,9 +263,131 @@ def main():
             print('Next page not found. Web scraping completed')
             break
 
-    driver.close()
+def resume_page(parts_dir):
+    "Returns the page after the last page stored in the part files of an interrupted scrape."
+
+    if not os.path.isdir(parts_dir):
+        return 1
+
+    last_pages = [int(name.split('.')[0].split('-')[1]) for name in os.listdir(parts_dir)
+                  if name.startswith('pages_') and not name.endswith('.tmp')]
+
+    return max(last_pages, default=0) + 1
+
+def write_part(rows, parts_dir, first_page, last_page, part_format):
+    "Writes the rows of consecutive pages into a part file, renamed in place once complete."
+
+    path = os.path.join(parts_dir, f"pages_{first_page:05d}-{last_page:05d}.{part_format}")
+    df = pd.DataFrame(rows, columns=listing_columns)
+
+    if part_format == 'parquet':
+        df.to_parquet(path + '.tmp', index=False)
+    else:
+        df.to_csv(path + '.tmp', index=False)
+
+    os.replace(path + '.tmp', path)
+
+def write_listing_parts(pages, parts_dir, chunk_pages=50, part_format='csv'):
+    """Appends the scraped pages to part files every few pages so memory use stays flat and \
+        an interrupted scrape can resume after the last part.
+
+    Parameters:
+        pages {generator} -- yields the page number and the board game features of each page.
+        parts_dir {string} -- directory where the part files are stored.
+        chunk_pages {int} -- number of pages stored in each part file.
+        part_format {string} -- 'csv' or 'parquet'.
+
+    Returns:
+        {int} -- number of board games written.
+    """
+
+    os.makedirs(parts_dir, exist_ok=True)
+    rows, first_page, total = [], None, 0
+
+    for page_number, page_rows in pages:
+
+        first_page = page_number if first_page is None else first_page
+        rows.extend(page_rows)
+        total += len(page_rows)
+        print(f'Page {page_number} scraped. {total} board games available.')
+
+        if page_number - first_page + 1 >= chunk_pages:
+            write_part(rows, parts_dir, first_page, page_number, part_format)
+            rows, first_page = [], None
+
+    if first_page is not None:
+        write_part(rows, parts_dir, first_page, page_number, part_format)
+
+    return total
+
+def merge_listing_parts(parts_dir, output_path):
+    """Merges the part files in page order into a single CSV file and removes the parts.
+
+    Parameters:
+        parts_dir {string} -- directory where the part files are stored.
+        output_path {string} -- path of the merged CSV file.
+
+    Returns:
+        {None} -- function returns no value.
+    """
+
+    parts = sorted(name for name in os.listdir(parts_dir) if name.startswith('pages_')
+                   and not name.endswith('.tmp'))
+
+    with open(output_path + '.tmp', 'w', encoding='utf-8', newline='') as output:
+        output.write(','.join(listing_columns) + '\n')
+
+        for name in parts:
+            path = os.path.join(parts_dir, name)
+
+            if name.endswith('.parquet'):
+                pd.read_parquet(path).to_csv(output, header=False, index=False)
+            else:
+                with open(path, encoding='utf-8', newline='') as part:
+                    part.readline() #header
+                    shutil.copyfileobj(part, output)
+
+    os.replace(output_path + '.tmp', output_path)
+    shutil.rmtree(parts_dir)
+
+def main():
+    "Main function python script."
+
+    #selenium options to remove errors
+    options = webdriver.ChromeOptions()
+    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+
+    if scrape_mode == "http":
+        options.add_argument('--headless=new') #browser is only needed to log in
+
+    driver = webdriver.Chrome(service = Service(static_vars["local_driver_path"]), options=options)
+    driver = initial_load(driver)
+
+    parts_dir = os.path.join(listing_parts_dir, datetime.today().strftime("%Y-%m-%d"))
+    first_page = resume_page(parts_dir)
+
+    if first_page > 1:
+        print(f'Resuming web scraping from page {first_page}.')
+
+    if scrape_mode == "http":
+        session = session_from_driver(driver, scrape_workers)
+        last_page = find_last_page(driver.page_source)
+        driver.close()
+
+        pages = iter_http_pages(session, scrape_workers, TokenBucket(rate=scrape_requests_per_sec),
+                                RetryPolicy(), first_page, last_page)
+        write_listing_parts(pages, parts_dir, listing_chunk_pages, listing_part_format)
+        print('Web scraping completed')
+
+    else:
+        try:
+            write_listing_parts(iter_browser_pages(driver, first_page), parts_dir,
+                                listing_chunk_pages, listing_part_format)
+        finally:
+            driver.close()
 
-    df.to_csv('data/boardgamegeek.csv', index=False)
+    #not reached when the scraping stops early, the CSV of the last complete scrape is kept
+    merge_listing_parts(parts_dir, 'data/boardgamegeek.csv')
 
 if __name__ == "__main__":
     main()
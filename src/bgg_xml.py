@@ -0,0 +1,377 @@
+import io
+from array import array
+from datetime import date
+from xml.etree import ElementTree as ET
+
+#typed arrays that back the numeric columns, the other columns are kept in lists of strings
+typecodes = {"int32": "i", "float64": "d"}
+
+#type partition of the tables built from a delta run, which are not full snapshots
+delta_type_suffix = "_delta"
+
+#columns of each table, in order; the date and type columns are constant for a file
+schemas = {
+    "details": [
+        ("bgg_id", "string"), ("bgg_type", "category"), ("name", "string"),
+        ("img_src", "string"), ("description", "string"), ("year_published", "int32"),
+        ("min_players", "int32"), ("max_players", "int32"), ("playing_time", "int32"),
+        ("min_playtime", "int32"), ("max_playtime", "int32"), ("min_age", "int32"),
+        ("users_rated", "int32"), ("average", "float64"), ("bayes_average", "float64"),
+        ("num_weights", "int32"), ("average_weight", "float64"), ("bgg_rank", "int32"),
+        ("num_owners", "int32"), ("subdomain_1", "category"), ("subdomain_1_rank", "int32"),
+        ("subdomain_2", "category"), ("subdomain_2_rank", "int32"), ("date", "constant"),
+        ("year", "constant"), ("month", "constant"), ("day", "constant"), ("type", "constant"),
+    ],
+    "classification": [
+        ("bgg_id", "string"), ("classification", "category"), ("value", "category"),
+        ("date", "constant"), ("type", "constant"),
+    ],
+    "poll": [
+        ("bgg_id", "string"), ("poll_title", "category"), ("poll_answer", "category"),
+        ("date", "constant"), ("type", "constant"),
+    ],
+}
+
+
+def iter_items(source):
+    """Parses a BGG XML document incrementally and yields each top-level <item> as soon as it is \
+        complete, clearing it afterwards so memory stays bounded by a single item.
+
+    Parameters:
+        source {string, bytes, or file object} -- XML document, or a binary file object such as \
+            the S3 StreamingBody that is read in chunks while the items are processed.
+
+    Returns:
+        {generator} -- yields the Element of each item.
+    """
+
+    if isinstance(source, str):
+        source = io.BytesIO(source.encode('utf-8'))
+    elif isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    context = ET.iterparse(source, events=('start', 'end'))
+    _, root = next(context)
+    depth = 0
+
+    for event, element in context:
+
+        if event == 'start':
+            depth += 1
+            continue
+
+        depth -= 1
+
+        if depth == 0 and element.tag == 'item':
+            yield element
+            element.clear()
+            root.clear() #drops the processed items from the document root
+
+
+def get_attribute(item, tag, attribute):
+    "Goes to the first instance of child tag of the current tag and extracts a specific attribute."
+
+    child_tag = item.find(tag)
+    return child_tag.get(attribute) if child_tag is not None else None
+
+def get_text(item,tag):
+    "Goes to the first instance of child tag of the current tag and extracts the text of the tag."
+
+    child_tag = item.find(tag)
+    return child_tag.text if child_tag is not None else None
+
+def poll_vote(results):
+    "Obtains the poll result with the maximum number of votes."
+
+    results_dict = {}
+
+    for result in results.findall('result'):
+        value = result.get('value')
+        numvotes = int(result.get('numvotes'))
+        results_dict[value] = numvotes
+
+    poll_winner = max(results_dict, key=results_dict.get)
+
+    return poll_winner
+
+class ColumnarTable:
+    """Collects the rows of a table into one typed array or list per column, so the dataframe \
+        is built from whole columns instead of a dictionary per row. pandas and pyarrow are only \
+        imported when the table is converted, which keeps them out of the parse.
+
+    Parameters:
+        schema {list} -- name and type of each column: int32, float64, category, string, or \
+            constant for the columns that have the same value in every row.
+        constants {dict} -- value of each constant column.
+    """
+
+    def __init__(self, schema, constants):
+        self.schema = schema
+        self.constants = constants
+        self.columns = {name: array(typecodes[dtype]) if dtype in typecodes else []
+                        for name, dtype in schema if dtype != "constant"}
+        self.appenders = [column.append for column in self.columns.values()]
+        self.num_rows = 0
+
+    def append(self, *values):
+        "Appends a row, with the value of each non-constant column in schema order."
+
+        for append, value in zip(self.appenders, values):
+            append(value)
+        self.num_rows += 1
+
+    def to_frame(self):
+        """Builds the dataframe of the table.
+
+        Returns:
+            {dataframe} -- typed columns, the category columns are written to Parquet as \
+                dictionary-encoded strings.
+        """
+
+        import numpy as np
+        import pandas as pd
+
+        data = {}
+
+        for name, dtype in self.schema:
+            if dtype == "constant":
+                value = self.constants[name]
+                data[name] = np.full(self.num_rows, value, dtype=np.int32 if isinstance(value, int) else object)
+            elif dtype in typecodes:
+                data[name] = np.frombuffer(self.columns[name], dtype=dtype) if self.num_rows else np.array([], dtype=dtype)
+            elif dtype == "category":
+                data[name] = pd.Categorical(self.columns[name])
+            else:
+                data[name] = np.array(self.columns[name], dtype=object)
+
+        return pd.DataFrame(data)
+
+    def to_arrow(self, exclude=()):
+        """Builds the Arrow table of the table from the column buffers without going through \
+            pandas, which pyarrow would otherwise import to convert the Python lists.
+
+        Parameters:
+            exclude {list} -- columns left out, such as the partition columns.
+
+        Returns:
+            {Table} -- pyarrow table with the category columns dictionary-encoded.
+        """
+
+        import pyarrow as pa
+
+        data = {}
+
+        for name, dtype in self.schema:
+            if name in exclude:
+                continue
+            if dtype == "constant":
+                value = self.constants[name]
+                data[name] = pa.Array.from_buffers(pa.int32(), self.num_rows, [None, pa.py_buffer(array('i', [value] * self.num_rows))]) \
+                    if isinstance(value, int) else arrow_strings([value] * self.num_rows)
+            elif dtype in typecodes:
+                data[name] = pa.Array.from_buffers(pa.type_for_alias(dtype), self.num_rows, [None, pa.py_buffer(self.columns[name])])
+            elif dtype == "category":
+                data[name] = arrow_strings(self.columns[name]).dictionary_encode()
+            else:
+                data[name] = arrow_strings(self.columns[name])
+
+        return pa.table(data)
+
+
+def arrow_strings(values):
+    """Builds an Arrow string array from the UTF-8 bytes and offsets of the values.
+
+    Parameters:
+        values {list} -- strings, None for the missing values.
+
+    Returns:
+        {StringArray} -- pyarrow array of the values.
+    """
+
+    import pyarrow as pa
+
+    encoded = [value.encode('utf-8') if value is not None else b'' for value in values]
+    offsets = array('i', [0]) #int32 offsets limit a column to 2 GB per file
+    offset = 0
+
+    for value in encoded:
+        offset += len(value)
+        offsets.append(offset)
+
+    validity = None
+    if None in values:
+        bitmap = bytearray((len(values) + 7) // 8)
+        for i, value in enumerate(values):
+            if value is not None:
+                bitmap[i // 8] |= 1 << (i % 8)
+        validity = pa.py_buffer(bitmap)
+
+    return pa.StringArray.from_buffers(len(values), pa.py_buffer(offsets), pa.py_buffer(b''.join(encoded)), validity)
+
+def to_int(value):
+    "Converts a rank to an integer, 0 if the board game is not ranked."
+
+    return int(value) if value != "Not Ranked" else 0
+
+def flatten_details(item, table):
+    """Flattens the statistics and ranks of a board game into a single row.
+
+    Parameters:
+        item {Element} -- <item> tag of a board game.
+        table {ColumnarTable} -- details table the row is appended to.
+    """
+
+    image_src=get_text(item, 'image') if not None else "N/A"
+
+    for ratings in item.find('statistics'):
+        users_rated = get_attribute(ratings, 'usersrated','value')
+        average = get_attribute(ratings, 'average','value')
+        bayes_average = get_attribute(ratings, 'bayesaverage','value')
+        num_owners = get_attribute(ratings, 'owned', 'value')
+        num_weights = get_attribute(ratings,'numweights' ,'value')
+        average_weight = get_attribute(ratings, 'averageweight', 'value')
+        rank = get_attribute(ratings.find('ranks'), 'rank','value')
+
+        rank_tags = ratings.findall('ranks')[0].findall('rank')
+
+        subdomain_1, subdomain_1_rank = "N/A", 0
+        subdomain_2, subdomain_2_rank = "N/A", 0
+
+        if len(rank_tags) > 1:
+            subdomain_1 = rank_tags[1].get('friendlyname')
+            subdomain_1_rank = to_int(rank_tags[1].get('value'))
+        if len(rank_tags) > 2:
+            subdomain_2 = rank_tags[2].get('friendlyname')
+            subdomain_2_rank = to_int(rank_tags[1].get('value'))
+
+    table.append(
+        item.get('id'),
+        item.get('type'),
+        get_attribute(item, 'name', 'value'),
+        image_src,
+        get_text(item, 'description'),
+        int(get_attribute(item, 'yearpublished', 'value')),
+        int(get_attribute(item, 'minplayers', 'value')),
+        int(get_attribute(item, 'maxplayers', 'value')),
+        int(get_attribute(item, 'playingtime', 'value')),
+        int(get_attribute(item, 'minplaytime', 'value')),
+        int(get_attribute(item, 'maxplaytime', 'value')),
+        int(get_attribute(item, 'minage', 'value')),
+        int(users_rated),
+        float(average),
+        float(bayes_average),
+        int(num_weights),
+        float(average_weight),
+        to_int(rank),
+        int(num_owners),
+        subdomain_1,
+        subdomain_1_rank,
+        subdomain_2,
+        subdomain_2_rank,
+    )
+
+def flatten_classification(item, table):
+    """Flattens the links of a board game such as its mechanics and categories, one row per link.
+
+    Parameters:
+        item {Element} -- <item> tag of a board game.
+        table {ColumnarTable} -- classification table the rows are appended to.
+    """
+
+    bgg_id = item.get('id')
+
+    for classifications in item.findall('link'):
+        table.append(bgg_id, classifications.get('type'), classifications.get('value'))
+
+def flatten_poll(item, table):
+    """Flattens the poll results of a board game, one row per poll or number of players.
+
+    Parameters:
+        item {Element} -- <item> tag of a board game.
+        table {ColumnarTable} -- poll table the rows are appended to.
+    """
+
+    bgg_id = item.get('id')
+
+    for poll in item.findall('poll'):
+        poll_name = poll.get('name')
+        total_votes = poll.get('totalvotes')
+
+        if poll_name == "suggested_numplayers" and total_votes != "0":
+
+            for results in poll.findall('results'):
+                table.append(bgg_id, f"{poll_name} - {results.get('numplayers')}", poll_vote(results))
+        else:
+
+            poll_answer = poll_vote(poll.find('results')) if total_votes != "0" else "N/A"
+            table.append(bgg_id, poll_name, poll_answer)
+
+flatteners = {
+    "details": flatten_details,
+    "classification": flatten_classification,
+    "poll": flatten_poll,
+}
+
+def build_tables(xml_data, tables=tuple(flatteners), delta=False):
+    """Walks each item of the XML file once and flattens it into every requested table.
+
+    Parameters:
+        xml_data {string, bytes, or file object} -- XML document or stream of the BGG API.
+        tables {list} -- names of the tables to build: details, classification, and/or poll.
+        delta {bool} -- whether the file comes from a delta run, its rows are then written \
+            to the <table>_delta type partition so they are not read as a full snapshot.
+
+    Returns:
+        {dict} -- ColumnarTable of each requested table.
+    """
+
+    today = date.today() #computed once per file instead of once per row
+    columnar_tables = {table: ColumnarTable(schemas[table], {
+        "date": today.strftime("%Y-%m-%d"),
+        "year": today.year,
+        "month": today.month,
+        "day": today.day,
+        "type": table + delta_type_suffix if delta else table,
+    }) for table in tables}
+
+    for item in iter_items(xml_data):
+        for table, columnar_table in columnar_tables.items():
+            flatteners[table](item, columnar_table)
+
+    return columnar_tables
+
+def flatten_bgg(xml_data, tables=tuple(flatteners)):
+    """Walks each item of the XML file once and flattens it into every requested table.
+
+    Parameters:
+        xml_data {string, bytes, or file object} -- XML document or stream of the BGG API.
+        tables {list} -- names of the tables to build: details, classification, and/or poll.
+
+    Returns:
+        {dict} -- pandas dataframe of each requested table.
+    """
+
+    return {table: columnar_table.to_frame()
+            for table, columnar_table in build_tables(xml_data, tables).items()}
+
+def concat_tables(table, frames):
+    """Combines the dataframes of the same table built from different files, keeping the \
+        category columns dictionary-encoded.
+
+    Parameters:
+        table {string} -- name of the table: details, classification, or poll.
+        frames {list} -- dataframes built by flatten_bgg.
+
+    Returns:
+        {dataframe} -- rows of all the dataframes.
+    """
+
+    import pandas as pd
+
+    df_table = pd.concat(frames, ignore_index=True)
+    #categories that differ between files are combined as plain strings by concat
+    for name, dtype in schemas[table]:
+        if dtype == "category" and df_table[name].dtype != "category":
+            df_table[name] = df_table[name].astype("category")
+
+    return df_table
@@ -0,0 +1,177 @@
+import os
+import random
+import argparse
+from xml.sax.saxutils import quoteattr, escape
+
+#number of links of each type, drawn between the bounds with a skew towards the lower bound
+link_counts = {
+    "boardgamecategory": (1, 6),
+    "boardgamemechanic": (1, 12),
+    "boardgamefamily": (0, 12),
+    "boardgameexpansion": (0, 60),
+    "boardgameaccessory": (0, 20),
+    "boardgameimplementation": (0, 4),
+    "boardgamedesigner": (1, 3),
+    "boardgameartist": (0, 6),
+    "boardgamepublisher": (1, 40),
+}
+
+#size of the pool of values of each link type, so values repeat across games like the real ones
+vocabulary_sizes = {
+    "boardgamecategory": 84,
+    "boardgamemechanic": 192,
+    "boardgamefamily": 4000,
+    "boardgameexpansion": 30000,
+    "boardgameaccessory": 5000,
+    "boardgameimplementation": 8000,
+    "boardgamedesigner": 20000,
+    "boardgameartist": 15000,
+    "boardgamepublisher": 12000,
+}
+
+family_ranks = ["Strategy Game Rank", "Family Game Rank", "Thematic Rank", "Wargame Rank",
+                "Party Game Rank", "Abstract Game Rank", "Customizable Rank", "Children's Game Rank"]
+language_levels = ["No necessary in-game text",
+                   "Some necessary text - easily memorized or small crib sheet",
+                   "Moderate in-game text - needs crib sheet or paste ups",
+                   "Extensive use of text - massive conversion needed to be playable",
+                   "Unplayable in another language"]
+player_ages = ["2", "3", "4", "5", "6", "8", "10", "12", "14", "16", "18", "21 and up"]
+words = ("players build trade cards resources board tiles victory points market city route "
+         "workers actions round turn dice empire explore train coal iron canal score deck").split()
+
+
+def skewed_count(rng, low, high):
+    "Draws a count between the bounds, most games having few links and some having many."
+
+    return low + int((high - low) * rng.random() ** 3)
+
+def synthetic_poll(rng, name, title, results):
+    """Builds a poll of a board game.
+
+    Parameters:
+        rng {Random} -- random number generator.
+        name {string} -- name attribute of the poll.
+        title {string} -- title attribute of the poll.
+        results {list} -- tuples of the numplayers attribute, None for a single <results>, and \
+            the values of its results.
+
+    Returns:
+        {string} -- XML of the poll, with no votes for a fifth of the games.
+    """
+
+    voted = rng.random() > 0.2
+    total_votes = 0
+    xml = []
+
+    for numplayers, values in results:
+        xml.append(f'<results numplayers="{numplayers}">' if numplayers is not None else '<results>')
+        for value in values:
+            numvotes = rng.randint(0, 500) if voted else 0
+            total_votes += numvotes
+            xml.append(f'<result value={quoteattr(value)} numvotes="{numvotes}" />')
+        xml.append('</results>')
+
+    return (f'<poll name="{name}" title="{title}" totalvotes="{total_votes if voted else 0}">'
+            + ''.join(xml) + '</poll>')
+
+def synthetic_item(rng, bgg_id):
+    """Builds an <item> with the same tags and a realistic number of names, links, poll \
+        results, and ranks as the BGG API.
+
+    Parameters:
+        rng {Random} -- random number generator.
+        bgg_id {int} -- ID of the board game.
+
+    Returns:
+        {string} -- XML of the item.
+    """
+
+    min_players = rng.randint(1, 3)
+    max_players = rng.randint(min_players, 8)
+    playing_time = rng.choice([15, 30, 45, 60, 90, 120, 180, 240])
+    ranked = rng.random() > 0.15
+
+    xml = [f'<item type="{rng.choice(["boardgame"] * 9 + ["boardgameexpansion"])}" id="{bgg_id}">',
+           f'<thumbnail>https://cf.geekdo-images.com/thumb/pic{bgg_id}.jpg</thumbnail>',
+           f'<image>https://cf.geekdo-images.com/original/pic{bgg_id}.jpg</image>',
+           f'<name type="primary" sortindex="1" value="Game {bgg_id}" />']
+    xml += [f'<name type="alternate" sortindex="1" value="Game {bgg_id} edition {i}" />'
+            for i in range(skewed_count(rng, 0, 10))]
+    xml.append(f'<description>{escape(" ".join(rng.choices(words, k=rng.randint(50, 400))))}</description>')
+    xml.append(f'<yearpublished value="{rng.randint(1950, 2023)}" />')
+    xml.append(f'<minplayers value="{min_players}" /><maxplayers value="{max_players}" />')
+    xml.append(synthetic_poll(rng, "suggested_numplayers", "User Suggested Number of Players",
+                              [(n, ["Best", "Recommended", "Not Recommended"])
+                               for n in [*map(str, range(1, max_players + 1)), f"{max_players}+"]]))
+    xml.append(f'<playingtime value="{playing_time}" /><minplaytime value="{playing_time // 2}" />'
+               f'<maxplaytime value="{playing_time}" /><minage value="{rng.choice(player_ages[3:10])}" />')
+    xml.append(synthetic_poll(rng, "suggested_playerage", "User Suggested Player Age", [(None, player_ages)]))
+    xml.append(synthetic_poll(rng, "language_dependence", "Language Dependence", [(None, language_levels)]))
+
+    for link_type, (low, high) in link_counts.items():
+        for value_id in rng.sample(range(vocabulary_sizes[link_type]), skewed_count(rng, low, high)):
+            xml.append(f'<link type="{link_type}" id="{value_id}" value="{link_type[9:].title()} {value_id}" />')
+
+    ranks = [f'<rank type="subtype" id="1" name="boardgame" friendlyname="Board Game Rank" '
+             f'value="{rng.randint(1, 26000) if ranked else "Not Ranked"}" bayesaverage="6.5" />']
+    ranks += [f'<rank type="family" id="{5000 + i}" name="family{i}" friendlyname="{family_rank}" '
+              f'value="{rng.randint(1, 5000) if ranked else "Not Ranked"}" bayesaverage="6.5" />'
+              for i, family_rank in enumerate(rng.sample(family_ranks, rng.choice([0, 1, 1, 2])))]
+
+    xml.append(f'<statistics page="1"><ratings>'
+               f'<usersrated value="{rng.randint(0, 100000)}" />'
+               f'<average value="{rng.uniform(1, 10):.5f}" /><bayesaverage value="{rng.uniform(0, 9):.5f}" />'
+               f'<ranks>{"".join(ranks)}</ranks>'
+               f'<stddev value="1.5" /><median value="0" /><owned value="{rng.randint(0, 200000)}" />'
+               f'<trading value="0" /><wanting value="0" /><wishing value="0" /><numcomments value="0" />'
+               f'<numweights value="{rng.randint(0, 5000)}" /><averageweight value="{rng.uniform(0, 5):.4f}" />'
+               f'</ratings></statistics></item>')
+
+    return ''.join(xml)
+
+def synthetic_document(first_id, items, seed=0):
+    """Builds an <items> document like a response of the BGG API.
+
+    Parameters:
+        first_id {int} -- ID of the first board game, the others follow.
+        items {int} -- number of board games, the BGG API returns up to 1200 per request.
+        seed {int} -- seed of the random number generator.
+
+    Returns:
+        {bytes} -- UTF-8 XML document.
+    """
+
+    rng = random.Random(f"{seed}-{first_id}")
+    xml = ['<?xml version="1.0" encoding="utf-8"?>\n<items termsofuse="https://boardgamegeek.com/xmlapi/termsofuse">']
+    xml += [synthetic_item(rng, bgg_id) for bgg_id in range(first_id, first_id + items)]
+    xml.append('</items>')
+
+    return '\n'.join(xml).encode('utf-8')
+
+def iter_synthetic_documents(total_items, items_per_file, seed=0):
+    "Yields the documents of a crawl of total_items board games, items_per_file in each."
+
+    for first_id in range(1, total_items + 1, items_per_file):
+        yield synthetic_document(first_id, min(items_per_file, total_items - first_id + 1), seed)
+
+def main():
+    "Main function python script."
+
+    parser = argparse.ArgumentParser(description="Writes synthetic BGG API XML files.")
+    parser.add_argument('--total-items', type=int, default=12000, help="board games in all the files, up to 150000")
+    parser.add_argument('--items-per-file', type=int, default=1200, help="board games per file, 1 to 1200")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-dir', default='data/raw/synthetic')
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    for i, document in enumerate(iter_synthetic_documents(args.total_items, args.items_per_file, args.seed)):
+        with open(os.path.join(args.output_dir, f"synthetic_{i:05d}.xml"), 'wb') as f:
+            f.write(document)
+
+    print(f"Wrote {i + 1} files with {args.total_items} items to {args.output_dir}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+from bgg_lambda import handler_config, process_batch
+
+
+def lambda_handler(event, context):
+    """Reads each raw XML file of the event once and writes the details, classification, and \
+        poll datasets, configured by <table>_output_path and <table>_glue_table."""
+
+    return process_batch(event, *handler_config(['details', 'classification', 'poll']))
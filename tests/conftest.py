@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+#the modules of src are scripts rather than a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+
+def pytest_addoption(parser):
+    parser.addoption('--run-slow', action='store_true', help="runs the tests marked as slow")
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "slow: takes hours, only runs with --run-slow")
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--run-slow'):
+        return
+
+    skip_slow = pytest.mark.skip(reason="needs --run-slow")
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip_slow)
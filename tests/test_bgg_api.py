@@ -0,0 +1,165 @@
+import os
+import sys
+import glob
+import importlib
+import urllib.parse
+from collections import deque
+from datetime import datetime
+
+import pytest
+
+from bgg_http import TokenBucket, RetryPolicy
+
+
+class FakeResponse:
+    "Streamed response of the fake API, records whether it was closed."
+
+    def __init__(self, status_code, body=b""):
+        self.status_code = status_code
+        self.headers = {}
+        self.body = body
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FakeSession:
+    """Stand-in for the pooled session that answers like the BGG API with a URL length limit, \
+        the body of each response is the list of requested IDs.
+
+    Parameters:
+        max_length {int} -- longest URL accepted, longer URLs get a 414.
+        fail_after {int} -- number of requests answered before the connection fails, never if None.
+    """
+
+    def __init__(self, max_length, fail_after=None):
+        self.max_length = max_length
+        self.fail_after = fail_after
+        self.requested, self.responses = [], []
+
+    def get(self, url, rate_limiter=None, **kwargs):
+        if self.fail_after is not None and len(self.responses) >= self.fail_after:
+            raise ConnectionError("Simulated crash.")
+
+        if len(url) > self.max_length:
+            response = FakeResponse(414)
+        else:
+            bgg_ids = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)['id'][0]
+            self.requested.extend(bgg_ids.split(','))
+            response = FakeResponse(200, bgg_ids.encode('utf-8'))
+
+        self.responses.append(response)
+        return response
+
+    def rejected(self):
+        return sum(response.status_code == 414 for response in self.responses)
+
+
+@pytest.fixture(scope='module')
+def bgg_api(tmp_path_factory):
+    #bgg_api reads the listing of the working directory when it is imported
+    work_dir = tmp_path_factory.mktemp('bgg_api')
+    os.makedirs(work_dir / 'data')
+    (work_dir / 'data' / 'boardgamegeek.csv').write_text("bgg_id\n1\n")
+
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        module = sys.modules.get('bgg_api') or importlib.import_module('bgg_api')
+    finally:
+        os.chdir(cwd)
+
+    module.bucket_name, module.bucket_key = 'bucket', 'raw/'
+    return module
+
+@pytest.fixture
+def bgg_ids():
+    return [str(bgg_id) for bgg_id in range(1, 400000, 197)]
+
+def run_fetch(bgg_api, tmp_path, bgg_ids, session, run, max_workers=4, s3_dir='s3'):
+    "Fetches the board games of a run with the fake session into a local bucket."
+
+    planner = bgg_api.BatchPlanner(bgg_ids, str(tmp_path / 'state.json'))
+    manifest = bgg_api.RunManifest(str(tmp_path / 'manifests' / f"{run['run_id']}.jsonl"), bgg_ids)
+
+    try:
+        return bgg_api.fetch_batches(bgg_api.LocalS3Client(str(tmp_path / s3_dir)), max_workers,
+                                     TokenBucket(rate=1e6, capacity=1e6), planner, manifest, session,
+                                     RetryPolicy(max_attempts=1, sleep=lambda delay: None),
+                                     run_date=datetime.strptime(run['run_date'], '%Y-%m-%d'))
+    finally:
+        planner.save()
+
+def uploaded_ids(tmp_path, s3_dir='s3'):
+    "Returns the board game IDs of every uploaded file and the date partitions of the files."
+
+    paths = glob.glob(str(tmp_path / s3_dir / 'bucket' / 'raw' / 'date=*' / '*.xml'))
+    bgg_ids = [bgg_id for path in paths for bgg_id in open(path).read().split(',')]
+
+    return bgg_ids, {os.path.basename(os.path.dirname(path)) for path in paths}
+
+
+def test_requeue_range_merges_with_adjacent_ranges(bgg_api):
+    pending = deque([(10, 20), (30, 40)])
+
+    bgg_api.requeue_range(pending, 20, 30)
+
+    assert list(pending) == [(10, 40)]
+
+def test_split_batches_cover_every_game_once(bgg_api, tmp_path, bgg_ids):
+    session = FakeSession(max_length=1500)
+    run = bgg_api.start_run(str(tmp_path / 'state.json'), datetime(2026, 10, 17, 9), False, False)
+
+    run_fetch(bgg_api, tmp_path, bgg_ids, session, run)
+    fetched, partitions = uploaded_ids(tmp_path)
+
+    assert session.rejected() > 0
+    assert sorted(fetched) == sorted(bgg_ids)
+    assert partitions == {'date=2026-17-10'}
+    assert all(response.closed for response in session.responses)
+
+def test_crashed_run_resumes_after_midnight(bgg_api, tmp_path, bgg_ids):
+    state_path = str(tmp_path / 'state.json')
+    run = bgg_api.start_run(state_path, datetime(2026, 10, 17, 23, 30), False, False)
+
+    with pytest.raises(ConnectionError):
+        run_fetch(bgg_api, tmp_path, bgg_ids, FakeSession(max_length=1500, fail_after=8), run, max_workers=1)
+    first_ids, _ = uploaded_ids(tmp_path)
+
+    resumed = bgg_api.start_run(state_path, datetime(2026, 10, 18, 0, 30), True, False)
+    session = FakeSession(max_length=1500)
+    run_fetch(bgg_api, tmp_path, bgg_ids, session, resumed, max_workers=1)
+    fetched, partitions = uploaded_ids(tmp_path)
+
+    assert resumed == run
+    assert 0 < len(first_ids) < len(bgg_ids)
+    assert not set(session.requested) & set(first_ids)
+    assert sorted(fetched) == sorted(bgg_ids)
+    assert partitions == {'date=2026-17-10'}
+
+def test_learned_limit_is_kept_across_runs(bgg_api, tmp_path, bgg_ids):
+    state_path = str(tmp_path / 'state.json')
+    run = bgg_api.start_run(state_path, datetime(2026, 10, 17, 9), False, False)
+
+    first_session = FakeSession(max_length=1500)
+    run_fetch(bgg_api, tmp_path, bgg_ids, first_session, run)
+    planner = bgg_api.BatchPlanner(bgg_ids, state_path)
+
+    second_session = FakeSession(max_length=1500)
+    run_fetch(bgg_api, tmp_path, bgg_ids, second_session, dict(run, run_id='second'), s3_dir='second')
+
+    assert planner.max_accepted <= 1500 < planner.min_rejected
+    assert bgg_api.load_api_state(state_path)['run'] == run
+    assert first_session.rejected() > 0
+    assert second_session.rejected() == 0
@@ -0,0 +1,38 @@
+import os
+import glob
+
+import pytest
+
+from bgg_html import parse_listing_page, parse_listing_page_soup
+
+fixtures = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'html', '*.html')))
+
+
+def read_page(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+def test_fixtures_are_found():
+    assert fixtures
+
+@pytest.mark.parametrize('path', fixtures, ids=os.path.basename)
+def test_lxml_parser_matches_beautifulsoup(path):
+    page = read_page(path)
+
+    board_games = parse_listing_page(page)
+
+    assert len(board_games) == 100
+    assert board_games == parse_listing_page_soup(page)
+
+def test_listing_row_fields():
+    board_games = parse_listing_page(read_page(fixtures[0]))
+
+    assert board_games[0] == {
+        "board_game_rank": "1",
+        "bgg_id": "224517",
+        "title": "Brass: Birmingham",
+        "year": "2018",
+        "geek_rating": "8.466",
+        "avg_rating": "8.61",
+        "num_voters": "42,488",
+    }
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pytest
+
+from bgg_recommender import load_analytics, build_model, recommend_all, band_masks, top_k_mask, verify
+
+analytics_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'analytics')
+
+#Scythe, Avalon, and Power Grid of the notebook, games with many tied scores, games that fall back
+#to the wider weight band, and a game without mechanics and categories
+reference_games = ['169786', '128882', '2651', '392023', '1472', '96913', '541', '272739', '18291']
+
+#bgg_recommend_single takes about two seconds a game, the full set runs with --run-slow
+reference_sample = 300
+
+
+def test_top_k_mask_breaks_ties_by_rank():
+    scores = np.array([[5.0, 3.0, 3.0, 3.0, 1.0, 9.0]])
+    candidates = np.array([[True, True, True, True, True, False]])
+
+    selected = top_k_mask(scores, candidates, k=3)
+
+    #the column left out has the best score but is not a candidate, the tie at 3.0 goes to the left
+    assert selected.tolist() == [[True, True, True, False, False, False]]
+
+def test_top_k_mask_with_fewer_candidates_than_k():
+    scores = np.array([[1.0, 2.0, 3.0], [0.0, 0.0, 0.0]])
+    candidates = np.array([[True, False, True], [False, False, False]])
+
+    selected = top_k_mask(scores, candidates, k=10)
+
+    assert selected.tolist() == [[True, False, True], [False, False, False]]
+
+def test_band_masks_fall_back_to_the_wider_band():
+    model = {
+        "average_weight": np.array([2.0, 2.2, 2.9, 3.1, 3.3, 1.8]),
+        "lower_weight": np.floor([2.0, 2.2, 2.9, 3.1, 3.3, 1.8]),
+        "upper_weight": np.ceil([2.0, 2.2, 2.9, 3.1, 3.3, 1.8]),
+    }
+    queries = np.array([1, 0])
+    shared = np.ones((2, 6), dtype=bool)
+    shared[0, 1] = shared[1, 0] = False
+
+    candidates = band_masks(model, queries, shared, k=2, margin=0.25)
+
+    #2.2 has three games in [2, 3]; 2.0 has only itself in [2, 2], so [1.75, 2.25] is used
+    assert candidates.tolist() == [
+        [True, False, True, False, False, False],
+        [False, True, False, False, False, True],
+    ]
+
+@pytest.fixture(scope='module')
+def analytics():
+    return load_analytics(analytics_dir)
+
+@pytest.fixture(scope='module')
+def recommended(analytics):
+    model = build_model(*analytics)
+    return model, recommend_all(model)
+
+def test_recommend_all_matches_bgg_recommend_single_on_edge_cases(analytics, recommended):
+    results = verify(*recommended, *analytics, games=reference_games)
+
+    assert results["different"] == []
+    assert results["identical"] + results["tied"] == len(reference_games)
+
+def test_recommend_all_matches_bgg_recommend_single_on_a_sample(analytics, recommended):
+    results = verify(*recommended, *analytics, sample=reference_sample, seed=0)
+
+    assert results["different"] == []
+    assert results["identical"] + results["tied"] == reference_sample
+
+@pytest.mark.slow
+def test_recommend_all_matches_bgg_recommend_single_on_all_games(analytics, recommended):
+    results = verify(*recommended, *analytics, sample=0)
+
+    assert results["different"] == []
+    assert results["identical"] + results["tied"] == len(recommended[0]["bgg_id"])